@@ -0,0 +1,132 @@
+import json
+import subprocess
+import threading
+from app.manifest import file_sha256
+
+# Bitrates in kbps, indexed by (MPEG version 1?, layer) then bitrate index
+BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+LAYERS = {3: 1, 2: 2, 1: 3}
+
+_durations = {}
+_durations_lock = threading.Lock()
+
+
+class AudioProbeError(Exception):
+    pass
+
+
+def parse_frame_header(header: bytes):
+    """Return (frame_length, samples, sample_rate) for an MPEG audio frame header, or None."""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version_bits = (header[1] >> 3) & 0x03
+    layer = LAYERS.get((header[1] >> 1) & 0x03)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version_bits == 1 or layer is None or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    mpeg1 = version_bits == 3
+    bitrate = BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version_bits][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate
+    if layer == 3 and not mpeg1:
+        return 72 * bitrate // sample_rate + padding, 576, sample_rate
+    return 144 * bitrate // sample_rate + padding, 1152, sample_rate
+
+
+def skip_id3v2(file) -> int:
+    header = file.read(10)
+    if len(header) == 10 and header[:3] == b"ID3":
+        size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+        return 10 + size + (10 if header[5] & 0x10 else 0)
+    return 0
+
+
+def vbr_frame_count(frame: bytes):
+    """Frame count from a Xing/Info or VBRI header in the first frame, if present."""
+    mpeg1 = (frame[1] >> 3) & 0x03 == 3
+    mono = (frame[3] >> 6) == 3
+    offset = 4 + (17 if mono else 32) if mpeg1 else 4 + (9 if mono else 17)
+    tag = frame[offset:offset + 4]
+    if tag in (b"Xing", b"Info") and len(frame) >= offset + 12:
+        flags = int.from_bytes(frame[offset + 4:offset + 8], "big")
+        if flags & 0x01:
+            return int.from_bytes(frame[offset + 8:offset + 12], "big")
+    if frame[36:40] == b"VBRI" and len(frame) >= 54:
+        return int.from_bytes(frame[50:54], "big")
+    return None
+
+
+def mp3_duration(path: str) -> float:
+    """Duration of an MP3 from its frame headers, without decoding any audio."""
+    with open(path, "rb") as file:
+        position = skip_id3v2(file)
+        file.seek(position)
+        first = file.read(4)
+        # Tolerate a little junk before the first frame
+        while parse_frame_header(first) is None:
+            if len(first) < 4 or position > 64 * 1024:
+                raise AudioProbeError(f"No MPEG audio frames found in {path}")
+            position += 1
+            file.seek(position)
+            first = file.read(4)
+
+        frame_length, samples, sample_rate = parse_frame_header(first)
+        file.seek(position)
+        frame_count = vbr_frame_count(file.read(frame_length))
+        if frame_count:
+            return frame_count * samples / sample_rate
+
+        total = 0.0
+        while True:
+            file.seek(position)
+            info = parse_frame_header(file.read(4))
+            if info is None:
+                break
+            frame_length, samples, sample_rate = info
+            total += samples / sample_rate
+            position += frame_length
+        if total <= 0:
+            raise AudioProbeError(f"No MPEG audio frames found in {path}")
+        return total
+
+
+def ffprobe_duration(path: str) -> float:
+    command = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", path]
+    try:
+        result = subprocess.run(command, check=True, capture_output=True, text=True)
+        return float(json.loads(result.stdout)["format"]["duration"])
+    except (subprocess.CalledProcessError, OSError, KeyError, ValueError) as e:
+        raise AudioProbeError(f"ffprobe could not read {path}: {e}") from e
+
+
+def probe_duration(path: str) -> float:
+    """Audio duration in seconds, memoized per file content hash.
+
+    MP3 frame headers are parsed directly; ffprobe metadata is the fallback
+    for anything the header parser does not understand.
+    """
+    try:
+        digest = file_sha256(path)
+    except OSError as e:
+        raise AudioProbeError(f"Cannot read audio file {path}: {e}") from e
+    with _durations_lock:
+        if digest in _durations:
+            return _durations[digest]
+    try:
+        duration = mp3_duration(path)
+    except AudioProbeError:
+        duration = ffprobe_duration(path)
+    with _durations_lock:
+        _durations[digest] = duration
+    return duration
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from decouple import config
+from app import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Maximum number of concurrent calls per upstream service
+CONCURRENCY_LIMITS = {
+    "gemini": config("GEMINI_CONCURRENCY", default=4, cast=int),
+    "tts": config("TTS_CONCURRENCY", default=8, cast=int),
+    "imagen": config("IMAGEN_CONCURRENCY", default=4, cast=int),
+    "gcs": config("GCS_CONCURRENCY", default=4, cast=int),
+}
+
+# Create every client during application startup instead of on the first request
+WARM_CLIENTS_ON_STARTUP = config("WARM_CLIENTS_ON_STARTUP", default=True, cast=bool)
+
+
+def use_credentials_file():
+    """Export GOOGLE_APPLICATION_CREDENTIALS from settings (e.g. .env) for the Google Cloud SDKs."""
+    credentials = config("GOOGLE_APPLICATION_CREDENTIALS", default=None)
+    if credentials:
+        os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", credentials)
+
+
+def create_gemini_model():
+    import google.generativeai as genai
+    genai.configure(api_key=config("SCRIPT_KEY"))
+    return genai.GenerativeModel("gemini-1.5-flash")
+
+
+def create_tts_client():
+    from google.cloud import texttospeech
+    use_credentials_file()
+    return texttospeech.TextToSpeechClient()
+
+
+def create_image_client():
+    from google import genai
+    return genai.Client(api_key=config("IMAGE_KEY", default=None))
+
+
+def create_storage_client():
+    from google.cloud import storage
+    from requests.adapters import HTTPAdapter
+    use_credentials_file()
+    emulator_host = config("STORAGE_EMULATOR_HOST", default=None)
+    if emulator_host:
+        # Local fake GCS server, e.g. for tests and benchmarks
+        from google.auth.credentials import AnonymousCredentials
+        client = storage.Client(project="test", credentials=AnonymousCredentials(),
+                                client_options={"api_endpoint": emulator_host})
+    else:
+        client = storage.Client()
+    # Keep enough pooled connections for every concurrent upload
+    adapter = HTTPAdapter(pool_connections=CONCURRENCY_LIMITS["gcs"], pool_maxsize=CONCURRENCY_LIMITS["gcs"])
+    client._http.mount("https://", adapter)
+    return client
+
+
+CLIENT_FACTORIES = {
+    "gemini": create_gemini_model,
+    "tts": create_tts_client,
+    "imagen": create_image_client,
+    "gcs": create_storage_client,
+}
+
+_clients = {}
+_client_lock = threading.Lock()
+_thread_limits = {name: threading.BoundedSemaphore(limit) for name, limit in CONCURRENCY_LIMITS.items()}
+_async_limits = {}
+_errors = {}
+_stats = {name: {"startup_seconds": 0.0, "calls": 0, "call_seconds": 0.0} for name in CLIENT_FACTORIES}
+
+
+def get_client(name: str):
+    """Return the shared client for an upstream, creating it on first use."""
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _client_lock:
+        if name not in _clients:
+            start = time.perf_counter()
+            try:
+                _clients[name] = CLIENT_FACTORIES[name]()
+            except Exception as e:
+                _errors[name] = str(e)
+                raise
+            _errors.pop(name, None)
+            _stats[name]["startup_seconds"] = time.perf_counter() - start
+            logger.info(f"Created {name} client in {_stats[name]['startup_seconds']:.3f}s.")
+        return _clients[name]
+
+
+def set_client(name: str, client):
+    """Inject a client, e.g. a fake in tests. Passing None drops the cached one."""
+    with _client_lock:
+        _errors.pop(name, None)
+        if client is None:
+            _clients.pop(name, None)
+        else:
+            _clients[name] = client
+
+
+def record_call(name: str, seconds: float):
+    with _client_lock:
+        _stats[name]["calls"] += 1
+        _stats[name]["call_seconds"] += seconds
+    metrics.observe("upstream_call_seconds", seconds, upstream=name)
+
+
+@contextmanager
+def upstream_call(name: str):
+    """Bound concurrent blocking calls to an upstream and time them."""
+    with _thread_limits[name]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record_call(name, time.perf_counter() - start)
+
+
+@asynccontextmanager
+async def upstream_call_async(name: str):
+    """Async counterpart of upstream_call for coroutines running on the event loop."""
+    loop = asyncio.get_running_loop()
+    key = (name, id(loop))
+    if key not in _async_limits:
+        _async_limits[key] = asyncio.Semaphore(CONCURRENCY_LIMITS[name])
+    async with _async_limits[key]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record_call(name, time.perf_counter() - start)
+
+
+async def startup(names=None):
+    """Warm up the shared clients concurrently. Failures are logged and retried on first use."""
+    if not WARM_CLIENTS_ON_STARTUP:
+        return
+
+    async def warm(name):
+        try:
+            await asyncio.to_thread(get_client, name)
+        except Exception as e:
+            logger.warning(f"Could not create {name} client at startup: {str(e)}")
+
+    await asyncio.gather(*(warm(name) for name in names or CLIENT_FACTORIES))
+
+
+def readiness() -> dict:
+    """State of every upstream client: warm, cold (not created yet) or failed with its error."""
+    with _client_lock:
+        states = {}
+        for name in CLIENT_FACTORIES:
+            if name in _clients:
+                states[name] = {"state": "warm"}
+            elif name in _errors:
+                states[name] = {"state": "failed", "error": _errors[name]}
+            else:
+                states[name] = {"state": "cold"}
+        return states
+
+
+def shutdown():
+    with _client_lock:
+        for name, client in list(_clients.items()):
+            try:
+                if name == "tts":
+                    client.transport.close()
+                elif hasattr(client, "close"):
+                    client.close()
+            except Exception as e:
+                logger.warning(f"Error closing {name} client: {str(e)}")
+        _clients.clear()
+
+
+def client_stats() -> dict:
+    """Per-upstream startup and call latency.
+
+    ``estimated_saved_seconds`` is the client setup time that every call
+    after the first would have paid without a shared client.
+    """
+    with _client_lock:
+        stats = {}
+        for name, entry in _stats.items():
+            calls = entry["calls"]
+            stats[name] = {
+                "startup_seconds": round(entry["startup_seconds"], 4),
+                "calls": calls,
+                "avg_call_seconds": round(entry["call_seconds"] / calls, 4) if calls else 0.0,
+                "estimated_saved_seconds": round(entry["startup_seconds"] * max(calls - 1, 0), 4),
+                "max_concurrency": CONCURRENCY_LIMITS[name],
+            }
+        return stats
@@ -1,56 +1,123 @@
 import asyncio
+import io
 import os
 import logging
-from google import genai
-from google.genai import types
-import aiofiles
+import random
+import time
 from decouple import config
+from app import metrics
+from app.clients import get_client, upstream_call_async
+from app.file_cache import FileCache, cache_key
+from app.video_assembly import SLIDE_IMAGE_QUALITY, image_slot_size, save_slide_image
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-# Configure Google Generative AI
-api_key = config("IMAGE_KEY", default=None)
-client = genai.Client(api_key=api_key)
+# Retry settings for quota and transient Imagen errors
+IMAGE_MODEL = "imagen-3.0-generate-002"
+IMAGE_TIMEOUT = config("IMAGE_TIMEOUT", default=60.0, cast=float)
+IMAGE_MAX_ATTEMPTS = config("IMAGE_MAX_ATTEMPTS", default=4, cast=int)
+IMAGE_BACKOFF_BASE = config("IMAGE_BACKOFF_BASE", default=1.0, cast=float)
+IMAGE_BACKOFF_MAX = config("IMAGE_BACKOFF_MAX", default=20.0, cast=float)
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Content-addressed cache of generated images, stored already fitted to the slide
+IMAGE_CACHE_ENABLED = config("IMAGE_CACHE_ENABLED", default=True, cast=bool)
+IMAGE_CACHE_DIR = config("IMAGE_CACHE_DIR", default="cache/images")
+IMAGE_CACHE_MAX_BYTES = config("IMAGE_CACHE_MAX_BYTES", default=256 * 1024 * 1024, cast=int)
+
+image_cache = FileCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, suffix=".jpg") if IMAGE_CACHE_ENABLED else None
+
+image_metrics = {"calls": 0, "retries": 0, "failures": 0, "last_seconds": 0.0, "max_seconds": 0.0}
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code in RETRYABLE_STATUS_CODES
+
+def backoff_delay(attempt: int) -> float:
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(IMAGE_BACKOFF_MAX, IMAGE_BACKOFF_BASE * 2 ** attempt))
+
+async def request_image(prompt: str):
+    """Call Imagen through the SDK's async surface, retrying transient failures."""
+    from google.genai import types
+
+    for attempt in range(IMAGE_MAX_ATTEMPTS):
+        try:
+            async with upstream_call_async("imagen"):
+                return await asyncio.wait_for(
+                    get_client("imagen").aio.models.generate_images(
+                        model=IMAGE_MODEL,
+                        prompt=prompt,
+                        config=types.GenerateImagesConfig(number_of_images=1),
+                    ),
+                    timeout=IMAGE_TIMEOUT,
+                )
+        except Exception as e:
+            if attempt + 1 >= IMAGE_MAX_ATTEMPTS or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            image_metrics["retries"] += 1
+            metrics.inc("upstream_retries_total", upstream="imagen")
+            logging.warning(f"Retrying image generation in {delay:.1f}s after: {str(e)}")
+            await asyncio.sleep(delay)
+
+def image_cache_stats() -> dict:
+    return image_cache.stats() if image_cache else {"enabled": False}
 
 # Asynchronous function to generate an image
-async def generate_image_async(prompt: str, file_path: str):
+async def generate_image_async(prompt: str, file_path: str, size=None):
+    """Generate an image for prompt and save it as a JPEG fitted to size.
+
+    size defaults to the image area of a 1280x720 slide. The full-resolution
+    Imagen output is decoded once here and never kept.
+    """
+    start = time.perf_counter()
     try:
         if not prompt.strip():
             logging.warning("Skipping empty prompt for image generation.")
             return
-        
-        response = client.models.generate_images(
-            model='imagen-3.0-generate-002',
-            prompt=prompt,
-            config=types.GenerateImagesConfig(number_of_images=1),
-        )
+
+        size = tuple(size or image_slot_size())
+        key = cache_key(prompt, IMAGE_MODEL, size, {"quality": SLIDE_IMAGE_QUALITY})
+        if image_cache and await asyncio.to_thread(image_cache.fetch, key, file_path):
+            logging.info(f"Cached image saved: {file_path}")
+            return
+
+        image_metrics["calls"] += 1
+        response = await request_image(prompt)
 
         for generated_image in response.generated_images:
             image_bytes = generated_image.image.image_bytes
+            await asyncio.to_thread(save_slide_image, io.BytesIO(image_bytes), file_path, size)
+            if image_cache:
+                await asyncio.to_thread(image_cache.store, key, file_path)
+
+            logging.info(f"Image saved: {file_path} ({time.perf_counter() - start:.2f}s)")
 
-            # Save the image asynchronously
-            async with aiofiles.open(file_path, "wb") as f:
-                await f.write(image_bytes)
-            
-            logging.info(f"Image saved: {file_path}")
-    
     except Exception as e:
+        image_metrics["failures"] += 1
+        metrics.inc("upstream_failures_total", upstream="imagen")
         logging.error(f"Error generating image for '{prompt}': {str(e)}")
+    finally:
+        elapsed = time.perf_counter() - start
+        image_metrics["last_seconds"] = round(elapsed, 3)
+        image_metrics["max_seconds"] = round(max(image_metrics["max_seconds"], elapsed), 3)
 
 # Main function to process multiple image prompts asynchronously
-async def process_images(prompts: list):
+async def process_images(prompts: list, output_directory: str = "output/images", size=None):
     try:
         if not prompts:
             raise ValueError("Image prompts list cannot be empty.")
 
-        output_directory = "output/images"
         os.makedirs(output_directory, exist_ok=True)
 
         tasks = []
         for i, prompt in enumerate(prompts, start=1):
-            file_path = f"{output_directory}/image_{i}.png"
-            tasks.append(generate_image_async(prompt, file_path))
+            file_path = f"{output_directory}/image_{i}.jpg"
+            tasks.append(generate_image_async(prompt, file_path, size))
 
         await asyncio.gather(*tasks)
         logging.info("All images have been generated successfully.")
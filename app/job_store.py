@@ -0,0 +1,528 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict
+from decouple import config
+from app.jobs import MAX_QUEUED_JOBS, Job, JobNotResumable, JobQueueFull
+from app.result_cache import result_key
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Shared job store for the render farm: empty keeps every job inside the API
+# process, otherwise sqlite:///path/to/jobs.db or redis://host:6379/0
+JOB_STORE = config("JOB_STORE", default="")
+# Running jobs and tasks whose worker has not sent a heartbeat for this
+# long are queued again (see HEARTBEAT_INTERVAL in app.jobs)
+HEARTBEAT_TIMEOUT = config("HEARTBEAT_TIMEOUT", default=60.0, cast=float)
+
+ACTIVE = ("queued", "running")
+
+# Redis scripts run atomically, so two API processes cannot both queue the
+# same topic and a worker that dies mid-claim cannot lose a job.
+# KEYS: topic, queue, job, finished. ARGV: job_id, job record, queue limit
+# (-1 for none), job key prefix.
+REDIS_ENQUEUE = """
+local existing = redis.call('GET', KEYS[1])
+if existing and existing ~= ARGV[1] then
+    local data = redis.call('GET', ARGV[4] .. existing)
+    if data then
+        local status = cjson.decode(data)['status']
+        if status == 'queued' or status == 'running' then
+            return {'existing', data}
+        end
+    end
+end
+if tonumber(ARGV[3]) >= 0 and redis.call('LLEN', KEYS[2]) >= tonumber(ARGV[3]) then
+    return {'full'}
+end
+redis.call('SET', KEYS[1], ARGV[1])
+redis.call('SET', KEYS[3], ARGV[2])
+redis.call('ZREM', KEYS[4], ARGV[1])
+redis.call('LPUSH', KEYS[2], ARGV[1])
+return {'queued'}
+"""
+# KEYS: queue, running. ARGV: worker_id, now, owner key prefix.
+REDIS_CLAIM = """
+local job_id = redis.call('RPOP', KEYS[1])
+if not job_id then
+    return false
+end
+redis.call('SET', ARGV[3] .. job_id, ARGV[1])
+redis.call('ZADD', KEYS[2], ARGV[2], job_id)
+return job_id
+"""
+# KEYS: tasks, tasks_running. ARGV: worker_id, now, task key prefix.
+REDIS_CLAIM_TASK = """
+local task_id = redis.call('RPOP', KEYS[1])
+if not task_id then
+    return false
+end
+local key = ARGV[3] .. task_id
+if redis.call('HEXISTS', key, 'name') == 0 then
+    return false
+end
+redis.call('HSET', key, 'status', 'running', 'worker_id', ARGV[1])
+redis.call('ZADD', KEYS[2], ARGV[2], task_id)
+return {task_id, redis.call('HGET', key, 'name'), redis.call('HGET', key, 'payload')}
+"""
+# Task updates only touch tasks that still exist and are running, so a
+# job that already deleted its task never sees it come back.
+# KEYS: task, tasks_running. ARGV: task_id, worker_id, now.
+REDIS_TASK_HEARTBEAT = """
+local task = redis.call('HMGET', KEYS[1], 'status', 'worker_id')
+if task[1] ~= 'running' or task[2] ~= ARGV[2] then
+    return 0
+end
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+return 1
+"""
+# KEYS: task, tasks_running. ARGV: task_id, status, result, error.
+REDIS_FINISH_TASK = """
+redis.call('ZREM', KEYS[2], ARGV[1])
+if redis.call('HGET', KEYS[1], 'status') ~= 'running' then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'status', ARGV[2], 'result', ARGV[3], 'error', ARGV[4])
+return 1
+"""
+# KEYS: task, tasks_running, tasks. ARGV: task_id.
+REDIS_RELEASE_TASK = """
+if redis.call('ZREM', KEYS[2], ARGV[1]) == 0 then
+    return 0
+end
+if redis.call('HGET', KEYS[1], 'status') ~= 'running' then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'status', 'queued', 'worker_id', '')
+redis.call('RPUSH', KEYS[3], ARGV[1])
+return 1
+"""
+
+
+class JobStoreError(Exception):
+    pass
+
+
+def job_from_data(data: str) -> Job:
+    return Job(**json.loads(data))
+
+
+class SQLiteJobStore:
+    """Job queue and per-slide task queue in one SQLite file.
+
+    Every render worker on the machine opens the same file. Claims run in
+    ``BEGIN IMMEDIATE`` transactions, so a queued job or task is handed to
+    exactly one worker. The full job record is kept as JSON next to the
+    columns used for queueing.
+    """
+
+    def __init__(self, path: str, max_queued: int = None):
+        self.path = path
+        self.max_queued = MAX_QUEUED_JOBS if max_queued is None else max_queued
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY, topic_key TEXT, status TEXT, data TEXT,
+                    worker_id TEXT, heartbeat_at REAL, created_at REAL, finished_at REAL);
+                CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+                CREATE INDEX IF NOT EXISTS jobs_topic ON jobs (topic_key, status);
+                CREATE TABLE IF NOT EXISTS tasks (
+                    task_id TEXT PRIMARY KEY, name TEXT, payload TEXT, status TEXT,
+                    result TEXT, error TEXT, worker_id TEXT, heartbeat_at REAL, created_at REAL);
+                CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, created_at);
+                CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, video_url TEXT, created_at REAL);
+            """)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def enqueue(self, job: Job) -> Job:
+        """Queue job, or return the job already queued or running for the same topic."""
+        key = result_key(job.topic, job.output)
+        with self._transaction() as db:
+            row = db.execute("SELECT data FROM jobs WHERE topic_key = ? AND status IN (?, ?)", (key, *ACTIVE)).fetchone()
+            if row:
+                return job_from_data(row[0])
+            queued = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queued:
+                raise JobQueueFull("Too many videos are queued, please try again later.")
+            db.execute("INSERT INTO jobs (job_id, topic_key, status, data, created_at) VALUES (?, ?, ?, ?, ?)",
+                       (job.job_id, key, job.status, json.dumps(asdict(job)), job.created_at))
+        return job
+
+    def add_finished(self, job: Job):
+        """Record a job that never needs rendering, e.g. a result cache hit."""
+        with self._connect() as db:
+            db.execute("INSERT INTO jobs (job_id, topic_key, status, data, created_at, finished_at) VALUES (?, ?, ?, ?, ?, ?)",
+                       (job.job_id, result_key(job.topic, job.output), job.status, json.dumps(asdict(job)), job.created_at,
+                        job.finished_at))
+
+    def get(self, job_id: str):
+        with self._connect() as db:
+            row = db.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return job_from_data(row[0]) if row else None
+
+    def claim(self, worker_id: str):
+        """Hand the oldest queued job to worker_id."""
+        with self._transaction() as db:
+            row = db.execute("SELECT data FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+            if row is None:
+                return None
+            job = job_from_data(row[0])
+            job.status = "running"
+            db.execute("UPDATE jobs SET status = ?, data = ?, worker_id = ?, heartbeat_at = ? WHERE job_id = ?",
+                       (job.status, json.dumps(asdict(job)), worker_id, time.time(), job.job_id))
+        return job
+
+    def save(self, job: Job, worker_id: str = None) -> bool:
+        """Write job back. With worker_id, only while that worker still owns it."""
+        query = "UPDATE jobs SET status = ?, data = ?, heartbeat_at = ?, finished_at = ? WHERE job_id = ?"
+        params = [job.status, json.dumps(asdict(job)), time.time(), job.finished_at, job.job_id]
+        if worker_id is not None:
+            query += " AND worker_id = ?"
+            params.append(worker_id)
+        with self._connect() as db:
+            return db.execute(query, params).rowcount == 1
+
+    def requeue(self, job_id: str) -> Job:
+        """Queue a failed job again, keeping its workspace."""
+        with self._transaction() as db:
+            row = db.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            job = job_from_data(row[0]) if row else None
+            if job is None or job.status != "failed":
+                raise JobNotResumable("Only failed jobs can be resumed.")
+            running = db.execute("SELECT data FROM jobs WHERE topic_key = ? AND status IN (?, ?)",
+                                 (result_key(job.topic, job.output), *ACTIVE)).fetchone()
+            if running:
+                return job_from_data(running[0])
+            job.status = "queued"
+            job.error = None
+            job.finished_at = None
+            job.stage = "queued"
+            db.execute("UPDATE jobs SET status = ?, data = ?, worker_id = NULL, finished_at = NULL WHERE job_id = ?",
+                       (job.status, json.dumps(asdict(job)), job_id))
+        return job
+
+    def release_stale(self, timeout: float = HEARTBEAT_TIMEOUT) -> int:
+        """Queue jobs and tasks again whose worker stopped heartbeating."""
+        cutoff = time.time() - timeout
+        with self._connect() as db:
+            jobs = db.execute("UPDATE jobs SET status = 'queued', worker_id = NULL, "
+                              "data = json_set(data, '$.status', 'queued') "
+                              "WHERE status = 'running' AND heartbeat_at < ?", (cutoff,)).rowcount
+            tasks = db.execute("UPDATE tasks SET status = 'queued', worker_id = NULL "
+                               "WHERE status = 'running' AND heartbeat_at < ?", (cutoff,)).rowcount
+        if jobs or tasks:
+            logger.warning(f"Requeued {jobs} jobs and {tasks} tasks from silent workers.")
+        return jobs + tasks
+
+    def prune(self, keep: int) -> list:
+        """Delete all but the newest ``keep`` finished jobs. Returns the deleted jobs."""
+        with self._transaction() as db:
+            rows = db.execute("SELECT job_id, data FROM jobs WHERE finished_at IS NOT NULL "
+                              "ORDER BY finished_at DESC LIMIT -1 OFFSET ?", (keep,)).fetchall()
+            db.executemany("DELETE FROM jobs WHERE job_id = ?", [(row[0],) for row in rows])
+        return [job_from_data(row[1]) for row in rows]
+
+    def get_result(self, key: str):
+        """Return the result cache entry ``{"video_url", "created_at"}`` for key, or None."""
+        with self._connect() as db:
+            row = db.execute("SELECT video_url, created_at FROM results WHERE key = ?", (key,)).fetchone()
+        return {"video_url": row[0], "created_at": row[1]} if row else None
+
+    def put_result(self, key: str, video_url: str, ttl: float):
+        """Record a finished video for the result cache and drop entries older than ttl."""
+        now = time.time()
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO results (key, video_url, created_at) VALUES (?, ?, ?)", (key, video_url, now))
+            db.execute("DELETE FROM results WHERE created_at < ?", (now - ttl,))
+
+    def count_results(self) -> int:
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def add_task(self, name: str, payload) -> str:
+        task_id = uuid.uuid4().hex
+        with self._connect() as db:
+            db.execute("INSERT INTO tasks (task_id, name, payload, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                       (task_id, name, json.dumps(payload), time.time()))
+        return task_id
+
+    def claim_task(self, worker_id: str):
+        """Return ``(task_id, name, payload)`` for the oldest queued task, or None."""
+        with self._transaction() as db:
+            row = db.execute("SELECT task_id, name, payload FROM tasks WHERE status = 'queued' "
+                             "ORDER BY created_at LIMIT 1").fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE tasks SET status = 'running', worker_id = ?, heartbeat_at = ? WHERE task_id = ?",
+                       (worker_id, time.time(), row[0]))
+        return row[0], row[1], json.loads(row[2])
+
+    def task_heartbeat(self, task_id: str, worker_id: str) -> bool:
+        with self._connect() as db:
+            return db.execute("UPDATE tasks SET heartbeat_at = ? WHERE task_id = ? AND worker_id = ? AND status = 'running'",
+                              (time.time(), task_id, worker_id)).rowcount == 1
+
+    def finish_task(self, task_id: str, result=None, error: str = None):
+        with self._connect() as db:
+            db.execute("UPDATE tasks SET status = ?, result = ?, error = ? WHERE task_id = ?",
+                       ("failed" if error else "done", json.dumps(result), error, task_id))
+
+    def get_task(self, task_id: str):
+        """Return ``{"status", "result", "error"}`` for a task, or None once it is gone."""
+        with self._connect() as db:
+            row = db.execute("SELECT status, result, error FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        return {"status": row[0], "result": json.loads(row[1]) if row[1] else None, "error": row[2]}
+
+    def delete_task(self, task_id: str):
+        with self._connect() as db:
+            db.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+
+    def stats(self) -> dict:
+        with self._connect() as db:
+            jobs = dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            tasks = dict(db.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+        return {"backend": "sqlite", "jobs": jobs, "tasks": tasks}
+
+
+class RedisJobStore:
+    """The same job and task queues on a Redis-compatible server, for workers on several machines.
+
+    Queued ids sit in lists, running ids in sorted sets scored by their last
+    heartbeat and the records themselves in plain keys. Needs the ``redis``
+    package.
+    """
+
+    def __init__(self, url: str, max_queued: int = None, prefix: str = "video:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise JobStoreError("JOB_STORE points at Redis but the redis package is not installed") from e
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.max_queued = MAX_QUEUED_JOBS if max_queued is None else max_queued
+        self.prefix = prefix
+        self._enqueue = self.redis.register_script(REDIS_ENQUEUE)
+        self._claim = self.redis.register_script(REDIS_CLAIM)
+        self._claim_task = self.redis.register_script(REDIS_CLAIM_TASK)
+        self._task_heartbeat = self.redis.register_script(REDIS_TASK_HEARTBEAT)
+        self._finish_task = self.redis.register_script(REDIS_FINISH_TASK)
+        self._release_task = self.redis.register_script(REDIS_RELEASE_TASK)
+
+    def _key(self, *parts) -> str:
+        return self.prefix + ":".join(parts)
+
+    def _write(self, job: Job, pipe=None):
+        (pipe or self.redis).set(self._key("job", job.job_id), json.dumps(asdict(job)))
+
+    def _push(self, job: Job, max_queued: int) -> list:
+        keys = [self._key("topic", result_key(job.topic, job.output)), self._key("queue"), self._key("job", job.job_id),
+                self._key("finished")]
+        return self._enqueue(keys=keys, args=[job.job_id, json.dumps(asdict(job)), max_queued, self._key("job", "")])
+
+    def enqueue(self, job: Job) -> Job:
+        outcome = self._push(job, self.max_queued)
+        if outcome[0] == "existing":
+            return job_from_data(outcome[1])
+        if outcome[0] == "full":
+            raise JobQueueFull("Too many videos are queued, please try again later.")
+        return job
+
+    def add_finished(self, job: Job):
+        pipe = self.redis.pipeline()
+        self._write(job, pipe)
+        pipe.zadd(self._key("finished"), {job.job_id: job.finished_at})
+        pipe.execute()
+
+    def get(self, job_id: str):
+        data = self.redis.get(self._key("job", job_id)) if job_id else None
+        return job_from_data(data) if data else None
+
+    def claim(self, worker_id: str):
+        # Pop, owner and running entry in one step; should the worker die
+        # right after, release_stale queues the job again.
+        job_id = self._claim(keys=[self._key("queue"), self._key("running")],
+                             args=[worker_id, time.time(), self._key("owner", "")])
+        if job_id is None:
+            return None
+        job = self.get(job_id)
+        if job is None:
+            pipe = self.redis.pipeline()
+            pipe.zrem(self._key("running"), job_id)
+            pipe.delete(self._key("owner", job_id))
+            pipe.execute()
+            return None
+        job.status = "running"
+        self._write(job)
+        return job
+
+    def save(self, job: Job, worker_id: str = None) -> bool:
+        if worker_id is not None and self.redis.get(self._key("owner", job.job_id)) != worker_id:
+            return False
+        pipe = self.redis.pipeline()
+        self._write(job, pipe)
+        if job.finished_at is None:
+            pipe.zadd(self._key("running"), {job.job_id: time.time()})
+        else:
+            pipe.zrem(self._key("running"), job.job_id)
+            pipe.delete(self._key("owner", job.job_id))
+            pipe.zadd(self._key("finished"), {job.job_id: job.finished_at})
+        pipe.execute()
+        if job.finished_at is not None:
+            topic_key = self._key("topic", result_key(job.topic, job.output))
+            if self.redis.get(topic_key) == job.job_id:
+                self.redis.delete(topic_key)
+        return True
+
+    def requeue(self, job_id: str) -> Job:
+        job = self.get(job_id)
+        if job is None or job.status != "failed":
+            raise JobNotResumable("Only failed jobs can be resumed.")
+        job.status = "queued"
+        job.error = None
+        job.finished_at = None
+        job.stage = "queued"
+        outcome = self._push(job, -1)
+        if outcome[0] == "existing":
+            return job_from_data(outcome[1])
+        return job
+
+    def release_stale(self, timeout: float = HEARTBEAT_TIMEOUT) -> int:
+        cutoff = time.time() - timeout
+        released = 0
+        for job_id in self.redis.zrangebyscore(self._key("running"), "-inf", cutoff):
+            # Only the worker that removes the entry requeues it
+            if not self.redis.zrem(self._key("running"), job_id):
+                continue
+            job = self.get(job_id)
+            if job is None:
+                continue
+            job.status = "queued"
+            pipe = self.redis.pipeline()
+            self._write(job, pipe)
+            pipe.delete(self._key("owner", job_id))
+            pipe.rpush(self._key("queue"), job_id)
+            pipe.execute()
+            released += 1
+        for task_id in self.redis.zrangebyscore(self._key("tasks_running"), "-inf", cutoff):
+            # Tasks the job has deleted meanwhile are only dropped from the running set
+            released += self._release_task(keys=[self._key("task", task_id), self._key("tasks_running"), self._key("tasks")],
+                                           args=[task_id])
+        if released:
+            logger.warning(f"Requeued {released} jobs and tasks from silent workers.")
+        return released
+
+    def prune(self, keep: int) -> list:
+        excess = self.redis.zcard(self._key("finished")) - keep
+        if excess <= 0:
+            return []
+        pruned = []
+        for job_id, _ in self.redis.zpopmin(self._key("finished"), excess):
+            job = self.get(job_id)
+            self.redis.delete(self._key("job", job_id))
+            if job is not None:
+                pruned.append(job)
+        return pruned
+
+    def get_result(self, key: str):
+        data = self.redis.get(self._key("result", key))
+        return json.loads(data) if data else None
+
+    def put_result(self, key: str, video_url: str, ttl: float):
+        # Entries expire on their own; the sorted set only backs count_results
+        now = time.time()
+        pipe = self.redis.pipeline()
+        pipe.set(self._key("result", key), json.dumps({"video_url": video_url, "created_at": now}), ex=max(1, int(ttl)))
+        pipe.zadd(self._key("results"), {key: now})
+        pipe.zremrangebyscore(self._key("results"), "-inf", now - ttl)
+        pipe.execute()
+
+    def count_results(self) -> int:
+        return self.redis.zcard(self._key("results"))
+
+    def add_task(self, name: str, payload) -> str:
+        task_id = uuid.uuid4().hex
+        pipe = self.redis.pipeline()
+        pipe.hset(self._key("task", task_id), mapping={"name": name, "payload": json.dumps(payload), "status": "queued"})
+        pipe.lpush(self._key("tasks"), task_id)
+        pipe.execute()
+        return task_id
+
+    def claim_task(self, worker_id: str):
+        claimed = self._claim_task(keys=[self._key("tasks"), self._key("tasks_running")],
+                                   args=[worker_id, time.time(), self._key("task", "")])
+        if not claimed:
+            return None
+        task_id, name, payload = claimed
+        return task_id, name, json.loads(payload)
+
+    def task_heartbeat(self, task_id: str, worker_id: str) -> bool:
+        return bool(self._task_heartbeat(keys=[self._key("task", task_id), self._key("tasks_running")],
+                                         args=[task_id, worker_id, time.time()]))
+
+    def finish_task(self, task_id: str, result=None, error: str = None):
+        # A no-op once the job stopped waiting for the task and deleted it
+        self._finish_task(keys=[self._key("task", task_id), self._key("tasks_running")],
+                          args=[task_id, "failed" if error else "done", json.dumps(result), error or ""])
+
+    def get_task(self, task_id: str):
+        task = self.redis.hgetall(self._key("task", task_id))
+        if not task:
+            return None
+        result = task.get("result")
+        return {"status": task["status"], "result": json.loads(result) if result else None, "error": task.get("error") or None}
+
+    def delete_task(self, task_id: str):
+        pipe = self.redis.pipeline()
+        pipe.delete(self._key("task", task_id))
+        pipe.lrem(self._key("tasks"), 0, task_id)
+        pipe.zrem(self._key("tasks_running"), task_id)
+        pipe.execute()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis",
+            "jobs": {"queued": self.redis.llen(self._key("queue")), "running": self.redis.zcard(self._key("running")),
+                     "finished": self.redis.zcard(self._key("finished"))},
+            "tasks": {"queued": self.redis.llen(self._key("tasks")), "running": self.redis.zcard(self._key("tasks_running"))},
+        }
+
+
+def get_job_store(url: str = JOB_STORE):
+    """Open the job store named by url, or return None for in-process jobs."""
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisJobStore(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteJobStore(url[len("sqlite:///"):])
+    raise JobStoreError(f"Unsupported JOB_STORE: {url}")
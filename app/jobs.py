@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field
+from decouple import config
+from app import metrics
+from app.output_profiles import normalize_output
+from app.result_cache import result_key
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Job queue settings
+MAX_CONCURRENT_JOBS = config("MAX_CONCURRENT_JOBS", default=2, cast=int)
+MAX_QUEUED_JOBS = config("MAX_QUEUED_JOBS", default=50, cast=int)
+MAX_FINISHED_JOBS = config("MAX_FINISHED_JOBS", default=500, cast=int)
+WORKSPACE_ROOT = config("WORKSPACE_ROOT", default=None)
+KEEP_WORKSPACES = config("KEEP_WORKSPACES", default=False, cast=bool)
+# Failed jobs keep their workspace and manifest so they can be resumed
+KEEP_FAILED_WORKSPACES = config("KEEP_FAILED_WORKSPACES", default=True, cast=bool)
+# With a shared job store: how often idle workers look for queued jobs, and
+# how often a running job's progress is saved as its heartbeat
+JOB_POLL_INTERVAL = config("JOB_POLL_INTERVAL", default=1.0, cast=float)
+HEARTBEAT_INTERVAL = config("HEARTBEAT_INTERVAL", default=5.0, cast=float)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobNotResumable(Exception):
+    pass
+
+
+class JobLost(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    job_id: str
+    topic: str
+    status: str = "queued"  # queued -> running -> completed / failed
+    stage: str = "queued"
+    progress: float = 0.0
+    video_url: str = None
+    error: str = None
+    workspace: str = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float = None
+    finished_at: float = None
+    trace: dict = None
+    timings: dict = field(default_factory=dict)
+    cached: bool = False
+    output: dict = None
+
+    def update(self, stage: str, progress: float):
+        self.stage = stage
+        self.progress = round(min(max(progress, 0.0), 1.0), 3)
+        logger.info(f"Job {self.job_id}: {stage} ({self.progress:.0%})")
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "topic": self.topic,
+            "output": self.output,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "video_url": self.video_url,
+            "error": self.error,
+            "cached": self.cached,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "timings": self.timings,
+            "trace": self.trace,
+        }
+
+
+class JobManager:
+    """Runs video jobs on a bounded pool of asyncio workers.
+
+    Every job gets its own temporary workspace directory, so concurrent
+    renders never share image, voiceover or clip paths. Submitting a topic
+    that is already queued or running returns that job (single flight), and
+    topics found in the result cache complete immediately.
+
+    With a shared ``store`` (see app.job_store) jobs are queued in the store
+    instead of in this process. The workers then claim jobs from the store
+    and save their progress to it as a heartbeat, and max_workers=0 gives a
+    thin API process that only submits and reads jobs.
+    """
+
+    def __init__(self, handler, max_workers=MAX_CONCURRENT_JOBS, max_queued=MAX_QUEUED_JOBS,
+                 workspace_root=WORKSPACE_ROOT, keep_workspaces=KEEP_WORKSPACES, result_cache=None,
+                 store=None, worker_id=None):
+        self.handler = handler
+        self.result_cache = result_cache
+        self.store = store
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.started = False
+        self.inflight = {}
+        self.max_workers = max_workers
+        self.workspace_root = workspace_root
+        self.keep_workspaces = keep_workspaces
+        self.jobs = {}
+        self.queue = asyncio.Queue(maxsize=max_queued)
+        self.workers = []
+        self.running = 0
+
+    async def start(self):
+        for i in range(self.max_workers):
+            self.workers.append(asyncio.create_task(self._worker(i)))
+        self.started = True
+        logger.info(f"Started {self.max_workers} video workers.")
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    async def submit(self, topic: str, output=None) -> Job:
+        """Queue a video for topic; output is an output profile (see app.output_profiles)."""
+        output = normalize_output(output)
+        key = result_key(topic, output)
+        if key in self.inflight:
+            return self.inflight[key]
+
+        job = Job(job_id=uuid.uuid4().hex, topic=topic, output=output)
+        if self.result_cache is not None:
+            video_url = await asyncio.to_thread(self.result_cache.lookup, topic, output)
+            # Another request may have started the same topic while we looked
+            if key in self.inflight:
+                return self.inflight[key]
+            if video_url:
+                job.status = "completed"
+                job.cached = True
+                job.video_url = video_url
+                job.stage = "done"
+                job.progress = 1.0
+                job.finished_at = time.time()
+                metrics.inc("jobs_total", status="cached")
+                if self.store is not None:
+                    await asyncio.to_thread(self.store.add_finished, job)
+                    return job
+                self.jobs[job.job_id] = job
+                self._prune_finished()
+                return job
+
+        if self.store is not None:
+            # The store does single flight across every API process
+            return await asyncio.to_thread(self.store.enqueue, job)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull("Too many videos are queued, please try again later.")
+        self.jobs[job.job_id] = job
+        self.inflight[key] = job
+        self._prune_finished()
+        return job
+
+    def get(self, job_id: str) -> Job:
+        if self.store is not None:
+            return self.store.get(job_id)
+        return self.jobs.get(job_id)
+
+    def _prune_finished(self):
+        if self.store is not None:
+            for job in self.store.prune(MAX_FINISHED_JOBS):
+                if job.workspace and not self.keep_workspaces:
+                    shutil.rmtree(job.workspace, ignore_errors=True)
+            return
+        finished = [job for job in self.jobs.values() if job.finished_at is not None]
+        if len(finished) <= MAX_FINISHED_JOBS:
+            return
+        finished.sort(key=lambda job: job.finished_at)
+        for job in finished[:len(finished) - MAX_FINISHED_JOBS]:
+            del self.jobs[job.job_id]
+            if job.workspace and not self.keep_workspaces:
+                shutil.rmtree(job.workspace, ignore_errors=True)
+
+    async def resume(self, job_id: str) -> Job:
+        """Queue a failed job again in its existing workspace."""
+        if self.store is not None:
+            # The workspace may live on another machine; the worker checks it
+            return await asyncio.to_thread(self.store.requeue, job_id)
+        job = self.jobs.get(job_id)
+        if job is None or job.status != "failed":
+            raise JobNotResumable("Only failed jobs can be resumed.")
+        if not job.workspace or not os.path.isdir(job.workspace):
+            raise JobNotResumable("The job workspace is gone, please create a new video.")
+        key = result_key(job.topic, job.output)
+        if key in self.inflight:
+            return self.inflight[key]
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull("Too many videos are queued, please try again later.")
+        job.status = "queued"
+        job.error = None
+        job.finished_at = None
+        job.update("queued", job.progress)
+        self.inflight[key] = job
+        return job
+
+    async def _worker(self, worker_id: int):
+        if self.store is not None:
+            await self._claim_jobs()
+            return
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self.queue.task_done()
+
+    async def _claim_jobs(self):
+        while True:
+            job = await asyncio.to_thread(self.store.claim, self.worker_id)
+            if job is None:
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+                continue
+            await self._run(job)
+
+    async def _heartbeat(self, job: Job, render):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            if not await asyncio.to_thread(self.store.save, job, self.worker_id):
+                logger.warning(f"Job {job.job_id} was handed to another worker, stopping.")
+                render.cancel()
+                return
+
+    async def _render(self, job: Job):
+        if self.store is None:
+            return await self.handler(job)
+        render = asyncio.create_task(self.handler(job))
+        heartbeat = asyncio.create_task(self._heartbeat(job, render))
+        try:
+            return await render
+        except asyncio.CancelledError:
+            if heartbeat.done():
+                raise JobLost("The job was handed to another worker")
+            raise
+        finally:
+            heartbeat.cancel()
+
+    async def _run(self, job: Job):
+        if not job.workspace or not os.path.isdir(job.workspace):
+            job.workspace = tempfile.mkdtemp(prefix=f"video_{job.job_id}_", dir=self.workspace_root)
+        job.status = "running"
+        job.started_at = time.time()
+        job.timings = {}
+        self.running += 1
+        metrics.set_gauge("jobs_in_progress", self.running)
+        try:
+            job.video_url = await self._render(job)
+            job.status = "completed"
+            job.update("done", 1.0)
+            if self.result_cache is not None:
+                await asyncio.to_thread(self.result_cache.store, job.topic, job.video_url, job.output)
+        except JobLost as e:
+            logger.warning(f"Job {job.job_id}: {str(e)}")
+            job.status = "lost"
+        except Exception as e:
+            logger.error(f"Job {job.job_id} failed: {str(e)}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            self.running -= 1
+            metrics.set_gauge("jobs_in_progress", self.running)
+            metrics.inc("jobs_total", status=job.status)
+            metrics.observe("job_seconds", job.finished_at - job.started_at, status=job.status)
+            self.inflight.pop(result_key(job.topic, job.output), None)
+            # A lost job's workspace now belongs to the worker that took it over
+            keep = self.keep_workspaces or job.status == "lost" or (job.status == "failed" and KEEP_FAILED_WORKSPACES)
+            if not keep:
+                shutil.rmtree(job.workspace, ignore_errors=True)
+            # A cancelled job is still "running" and is requeued once its heartbeat times out
+            if self.store is not None and job.status not in ("running", "lost"):
+                await asyncio.to_thread(self.store.save, job, self.worker_id)
+                await asyncio.to_thread(self._prune_finished)
@@ -1,119 +1,149 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-from app.script_generation import fetch_script_from_gemini
-from app.voiceover_generation import process_voiceovers
-from app.image_generation import process_images
-from app.video_assembly import assemble_video
-from google.cloud import storage
-import asyncio
-import json
+from pydantic import BaseModel, Field, model_validator
+from app.voiceover_generation import voiceover_cache_stats
+from app.image_generation import image_cache_stats, image_metrics
+from app.video_assembly import shutdown_render_pool
+from app.pipeline import run_video_job
+from app.jobs import MAX_CONCURRENT_JOBS, JobManager, JobNotResumable, JobQueueFull
+from app.job_store import JOB_STORE, get_job_store
+from app.result_cache import create_result_cache
+from app.output_profiles import DEFAULT_RESOLUTION, normalize_output
+from app import clients, metrics
 import os
-import aiofiles
+import asyncio
 import logging
-from functools import lru_cache
+from contextlib import asynccontextmanager
+from typing import List, Literal, Optional
 from decouple import config
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global job_store, result_cache, job_manager
+    # Opened here rather than on import: the store may create its database
+    # and the result cache reads its index from disk
+    job_store = get_job_store()
+    result_cache = create_result_cache(index=job_store)
+    job_manager = JobManager(run_video_job, max_workers=API_RENDER_JOBS, result_cache=result_cache, store=job_store)
+    # Warm the clients in the background; /ready reports when they are done
+    app.state.warmup = asyncio.create_task(clients.startup())
+    await job_manager.start()
+    yield
+    app.state.warmup.cancel()
+    await job_manager.stop()
+    shutdown_render_pool()
+    clients.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 STATIC_DIR = os.path.join(BASE_DIR, "static")
 
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
-# Cache environment variables for performance
-@lru_cache()
-def get_google_credentials():
-    return config("GOOGLE_APPLICATION_CREDENTIALS")
-
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = config("GOOGLE_APPLICATION_CREDENTIALS")
-
-# Load Google Cloud Storage bucket name
-BUCKET_NAME = config("BUCKET")
-
 @app.get("/")
 def read_root():
     return FileResponse(os.path.join(STATIC_DIR, "index.html"))
 
-# Input validation model
+Resolution = Literal["360p", "480p", "720p", "1080p"]
+
+# Input validation models
+class OutputProfile(BaseModel):
+    resolution: Resolution = DEFAULT_RESOLUTION
+    # Overrides the encode profile's CRF; lower is better quality
+    crf: Optional[int] = Field(None, ge=18, le=35)
+    max_bitrate: Optional[str] = Field(None, pattern=r"^\d+[kM]$")
+    # hls: fragmented MP4 segments with one rendition per ladder tier up to resolution
+    format: Literal["mp4", "hls"] = "mp4"
+    ladder: Optional[List[Resolution]] = Field(None, min_length=1)
+
+    @model_validator(mode="after")
+    def check_profile(self):
+        # Raised as a 422, e.g. for ladder tiers above resolution
+        normalize_output(self.model_dump())
+        return self
+
 class VideoRequest(BaseModel):
     topic: str = Field(..., min_length=3, max_length=100)
+    output: OutputProfile = Field(default_factory=OutputProfile)
 
-# Function to upload video to Google Cloud Storage
-def upload_to_gcs(local_file_path, bucket_name, destination_blob_name):
-    try:
-        client = storage.Client()
-        bucket = client.bucket(bucket_name)
-        blob = bucket.blob(destination_blob_name)
-        blob.upload_from_filename(local_file_path)
-        logger.info(f"File {local_file_path} uploaded to {destination_blob_name} in bucket {bucket_name}.")
-        return f"https://storage.googleapis.com/{bucket_name}/{destination_blob_name}"
-    except Exception as e:
-        logger.error(f"Error uploading to Cloud Storage: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Upload error: {str(e)}")
-
-# Async function to save JSON file
-async def save_json_async(filename, data):
-    try:
-        async with aiofiles.open(filename, "w") as file:
-            await file.write(json.dumps(data, indent=4))
-    except Exception as e:
-        logger.error(f"Error saving JSON: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"JSON save error: {str(e)}")
+# Video jobs rendered by this process when API_RENDER_JOBS allows it; with a
+# JOB_STORE the default is a thin API and render workers do the rendering
+API_RENDER_JOBS = config("API_RENDER_JOBS", default=0 if JOB_STORE else MAX_CONCURRENT_JOBS, cast=int)
+
+# Created by the lifespan hook
+job_store = None
+result_cache = None
+job_manager = None
 
-@app.post("/create-video/")
+def cache_gauges():
+    caches = {"tts": voiceover_cache_stats(), "image": image_cache_stats(),
+              "result": result_cache.stats() if result_cache else {}}
+    return [("cache_stats", value, {"cache": cache, "event": event})
+            for cache, stats in caches.items() for event, value in stats.items() if event != "enabled"]
+
+metrics.register_gauges(cache_gauges)
+
+@app.post("/create-video/", status_code=202)
 async def video_creation(request: VideoRequest):
     try:
-        topic = request.topic.strip()
-        script = fetch_script_from_gemini(topic)
-
-        if "error" in script:
-            raise HTTPException(status_code=500, detail=f"Gemini API error: {script['error']}")
-
-        title = script.get("title", "No title provided")
-        introduction = script.get("introduction", {})
-        print("Data type of introduction:- ", type(introduction))
-        sections = script.get("sections", [])
-        conclusion = script.get("conclusion", {})
-
-        voiceover_texts = []
-        if introduction.get("voiceover"):
-            voiceover_texts.append({"part": "Introduction", "text": introduction["voiceover"]})
-        for i, section in enumerate(sections):
-            if section.get("voiceover"):
-                voiceover_texts.append({"part": f"Section {i+1}", "text": section["voiceover"]})
-        if conclusion.get("voiceover"):
-            voiceover_texts.append({"part": "Conclusion", "text": conclusion["voiceover"]})
-
-        assembly_data = {
-            "slides": {
-                "title": title,
-                "introduction": dict(introduction).get("slide_points", []),
-                "sections": [{"heading": dict(sec).get("heading", "No heading"), "slide_points": dict(sec).get("slide_points", [])} for sec in sections],
-            },
-            "conclusion": {"slide_points": dict(conclusion).get("slide_points", [])},
-        }
-
-        voiceover_task = asyncio.create_task(process_voiceovers(voiceover_texts))
-        image_task = asyncio.create_task(process_images([section.get("image_placeholder") for section in [introduction] + sections + [conclusion] if section.get("image_placeholder")]))
-
-        await asyncio.gather(voiceover_task, image_task)
-
-        assembly_file = "assembly.json"
-        await save_json_async(assembly_file, assembly_data)
-
-        output_video_path = f"output/videos/{topic.replace(' ', '_')}_video.mp4"
-        assemble_video(assembly_file=assembly_file, output_video_path=output_video_path)
-
-        destination_blob_name = f"video/{topic.replace(' ', '_')}_video.mp4"
-        video_url = upload_to_gcs(local_file_path=output_video_path, bucket_name=BUCKET_NAME, destination_blob_name=destination_blob_name)
-
-        return {"status": "Video created and uploaded successfully", "video_url": video_url}
-    except Exception as e:
-        logger.error(f"Processing failed: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to process script: {str(e)}")
+        job = await job_manager.submit(request.topic.strip(), request.output.model_dump())
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"job_id": job.job_id, "status": job.status, "status_url": f"/jobs/{job.job_id}"}
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    # A job store lookup may wait on SQLite locks or Redis
+    job = await asyncio.to_thread(job_manager.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.post("/jobs/{job_id}/resume", status_code=202)
+async def resume_job(job_id: str):
+    if await asyncio.to_thread(job_manager.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    try:
+        job = await job_manager.resume(job_id)
+    except JobNotResumable as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"job_id": job.job_id, "status": job.status, "status_url": f"/jobs/{job.job_id}"}
+
+def collect_stats():
+    return {
+        "voiceover_cache": voiceover_cache_stats(),
+        "result_cache": result_cache.stats() if result_cache else {"enabled": False},
+        "images": image_metrics,
+        "image_cache": image_cache_stats(),
+        "clients": clients.client_stats(),
+        "job_store": job_store.stats() if job_store else {"enabled": False},
+    }
+
+@app.get("/stats")
+async def stats():
+    # The job store and the result index behind it are queried in a thread
+    return await asyncio.to_thread(collect_stats)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    # The cache gauges read the result index from the job store
+    return await asyncio.to_thread(metrics.render)
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until client warm-up has finished without failures."""
+    warmup = getattr(app.state, "warmup", None)
+    backends = clients.readiness()
+    warming = warmup is not None and not warmup.done()
+    is_ready = not warming and job_manager is not None and job_manager.started and all(
+        backend["state"] != "failed" for backend in backends.values())
+    body = {"ready": is_ready, "warming": warming, "backends": backends}
+    return JSONResponse(body, status_code=200 if is_ready else 503)
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from app.file_cache import cache_key
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Per-job record of completed pipeline stages.
+
+    Every stage entry stores a hash of the stage inputs, the content hash of
+    each artifact it produced and optional data (such as the script). A
+    stage is reusable when its inputs are unchanged and every artifact is
+    still on disk with the recorded hash.
+
+    Hashing reads whole artifacts, so async code should call is_valid and
+    complete from a thread; stages of one job may complete concurrently.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.stages = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file).get("stages", {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable manifest {self.path}: {str(e)}")
+            return {}
+
+    def _save(self):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump({"stages": self.stages}, file, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def is_valid(self, stage: str, inputs=None) -> bool:
+        with self.lock:
+            entry = self.stages.get(stage)
+        if entry is None or entry["inputs"] != cache_key(inputs):
+            return False
+        for path, digest in entry["artifacts"].items():
+            try:
+                if file_sha256(path) != digest:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def complete(self, stage: str, inputs=None, artifacts=(), data=None) -> bool:
+        """Record a finished stage. Returns False if an artifact is missing."""
+        hashes = {}
+        for path in artifacts:
+            if not os.path.exists(path):
+                logger.warning(f"Stage {stage} finished without its artifact {path}")
+                with self.lock:
+                    self.stages.pop(stage, None)
+                return False
+            hashes[path] = file_sha256(path)
+        with self.lock:
+            self.stages[stage] = {"inputs": cache_key(inputs), "artifacts": hashes, "data": data, "completed_at": time.time()}
+            self._save()
+        return True
+
+    def data(self, stage: str):
+        with self.lock:
+            entry = self.stages.get(stage)
+        return entry["data"] if entry else None
+
+    def artifact_hash(self, path: str):
+        with self.lock:
+            for entry in self.stages.values():
+                if path in entry["artifacts"]:
+                    return entry["artifacts"][path]
+        return None
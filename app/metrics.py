@@ -0,0 +1,223 @@
+import contextvars
+import json
+import logging
+import os
+import resource
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Histogram buckets in seconds, from quick Pillow renders up to full jobs
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+HELP = {
+    "stage_seconds": "Wall time of pipeline stages.",
+    "stage_cpu_seconds": "CPU time of render processes and ffmpeg runs, by the stage that started them.",
+    "upstream_call_seconds": "Latency of calls to upstream APIs.",
+    "upstream_retries_total": "Retried upstream calls.",
+    "upstream_failures_total": "Upstream calls that failed for good.",
+    "ffmpeg_wall_seconds": "Wall time of ffmpeg runs.",
+    "ffmpeg_cpu_seconds": "CPU time (user + system) of ffmpeg runs.",
+    "jobs_total": "Finished video jobs by status.",
+    "jobs_in_progress": "Video jobs currently running.",
+    "job_seconds": "Wall time of whole video jobs.",
+    "cache_stats": "Cache hit, miss, eviction and entry counts.",
+}
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_gauges = {}
+_gauge_callbacks = []
+
+# Set inside render pool workers so their samples can be shipped to the parent
+_captured = None
+
+# The innermost span; asyncio tasks and asyncio.to_thread inherit it
+_stage = contextvars.ContextVar("metrics_stage", default=None)
+
+
+def _key(labels: dict):
+    return tuple(sorted(labels.items()))
+
+
+def observe(name: str, value: float, **labels):
+    """Add a sample to a histogram."""
+    key = _key(labels)
+    with _lock:
+        histogram = _histograms.setdefault(name, {}).setdefault(
+            key, {"buckets": [0] * len(DEFAULT_BUCKETS), "sum": 0.0, "count": 0})
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+        if _captured is not None:
+            _captured.append(("observe", name, value, labels))
+
+
+def inc(name: str, amount: float = 1, **labels):
+    key = _key(labels)
+    with _lock:
+        counters = _counters.setdefault(name, {})
+        counters[key] = counters.get(key, 0) + amount
+        if _captured is not None:
+            _captured.append(("inc", name, amount, labels))
+
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges.setdefault(name, {})[_key(labels)] = value
+
+
+def register_gauges(callback):
+    """Register a callable returning ``[(name, value, labels), ...]``, evaluated on every scrape."""
+    _gauge_callbacks.append(callback)
+
+
+def stage_cpu(seconds: float):
+    """Charge CPU time to the stage of the enclosing span, if there is one."""
+    stage = _stage.get()
+    if stage is not None:
+        observe("stage_cpu_seconds", seconds, stage=stage)
+
+
+def run_captured(func, *args):
+    """Run func and return ``(result, samples)``. Used in render pool workers.
+
+    The samples include the CPU time of the worker and of the ffmpeg runs it
+    waited for; merge charges it to the stage that submitted func.
+    """
+    global _captured
+    _captured = []
+    start = time.process_time()
+    try:
+        result = func(*args)
+        ffmpeg_cpu = sum(value for kind, name, value, _ in _captured if kind == "observe" and name == "ffmpeg_cpu_seconds")
+        _captured.append(("cpu", "stage_cpu_seconds", time.process_time() - start + ffmpeg_cpu, {}))
+        return result, _captured
+    finally:
+        _captured = None
+
+
+def run_with_cpu(func, *args):
+    """Run func in this thread and charge its CPU time to the current stage."""
+    start = time.thread_time()
+    try:
+        return func(*args)
+    finally:
+        stage_cpu(time.thread_time() - start)
+
+
+def merge(samples):
+    """Replay samples recorded by run_captured in another process."""
+    for kind, name, value, labels in samples:
+        if kind == "observe":
+            observe(name, value, **labels)
+        elif kind == "cpu":
+            stage_cpu(value)
+        else:
+            inc(name, value, **labels)
+
+
+@contextmanager
+def span(stage: str, job=None, **fields):
+    """Time a pipeline stage: histogram sample, structured log line and job timing."""
+    start = time.perf_counter()
+    status = "ok"
+    token = _stage.set(stage)
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        _stage.reset(token)
+        seconds = time.perf_counter() - start
+        observe("stage_seconds", seconds, stage=stage)
+        record = {"event": "span", "stage": stage, "seconds": round(seconds, 4), "status": status, **fields}
+        if job is not None:
+            record["job_id"] = job.job_id
+            job.timings[stage] = round(job.timings.get(stage, 0.0) + seconds, 4)
+        logger.info(json.dumps(record))
+
+
+def wait_ffmpeg(process, operation: str, start: float) -> int:
+    """Wait for an ffmpeg process and record its wall and CPU time. Returns the exit code."""
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    process.returncode = os.waitstatus_to_exitcode(status)
+    observe("ffmpeg_wall_seconds", time.perf_counter() - start, operation=operation)
+    observe("ffmpeg_cpu_seconds", usage.ru_utime + usage.ru_stime, operation=operation)
+    stage_cpu(usage.ru_utime + usage.ru_stime)
+    return process.returncode
+
+
+def run_ffmpeg(command, operation: str):
+    """subprocess.run(command, check=True) that records ffmpeg wall and CPU time."""
+    start = time.perf_counter()
+    process = subprocess.Popen(command)
+    returncode = wait_ffmpeg(process, operation, start)
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command)
+
+
+def snapshot() -> dict:
+    """Histogram sums and counts and counter values, keyed by name and then label values."""
+    with _lock:
+        histograms = {name: {",".join(str(value) for _, value in labels): {"count": h["count"], "sum": round(h["sum"], 6)}
+                             for labels, h in series.items()} for name, series in _histograms.items()}
+        counters = {name: {",".join(str(value) for _, value in labels): value for labels, value in series.items()}
+                    for name, series in _counters.items()}
+    return {"histograms": histograms, "counters": counters}
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{str(value)}"' for key, value in items) + "}"
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    for callback in _gauge_callbacks:
+        try:
+            for name, value, labels in callback():
+                set_gauge(name, value, **labels)
+        except Exception as e:
+            logger.warning(f"Metrics callback failed: {str(e)}")
+
+    lines = []
+    with _lock:
+        for name, series in sorted(_histograms.items()):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in sorted(series.items()):
+                for bound, count in zip(DEFAULT_BUCKETS, histogram["buckets"]):
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+        for kind, metrics in (("counter", _counters), ("gauge", _gauges)):
+            for name, series in sorted(metrics.items()):
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    lines.append("# TYPE process_cpu_seconds_total counter")
+    lines.append(f"process_cpu_seconds_total {usage.ru_utime + usage.ru_stime:.6f}")
+    lines.append("# TYPE process_max_rss_bytes gauge")
+    lines.append(f"process_max_rss_bytes {usage.ru_maxrss * 1024}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,88 @@
+import re
+from decouple import config
+
+# 16:9 output sizes. Slides are laid out for 1280x720 and scaled to the tier.
+RESOLUTIONS = {
+    "360p": (640, 360),
+    "480p": (854, 480),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+}
+DEFAULT_RESOLUTION = config("DEFAULT_RESOLUTION", default="720p")
+
+# Peak bitrate of each HLS rendition
+HLS_BITRATES = {"360p": "800k", "480p": "1400k", "720p": "2800k", "1080p": "5000k"}
+HLS_SEGMENT_SECONDS = config("HLS_SEGMENT_SECONDS", default=4, cast=int)
+
+FORMATS = ("mp4", "hls")
+
+
+def normalize_output(output=None) -> dict:
+    """Fill in the defaults of an output profile.
+
+    ``resolution`` is the tier of the MP4, or the top rendition for HLS;
+    ``crf`` and ``max_bitrate`` override the encode profile; ``ladder``
+    lists the HLS renditions and defaults to every tier up to resolution.
+    """
+    output = dict(output or {})
+    resolution = output.get("resolution") or DEFAULT_RESOLUTION
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    output_format = output.get("format") or "mp4"
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    max_bitrate = output.get("max_bitrate")
+    if max_bitrate is not None and not re.fullmatch(r"\d+[kM]", max_bitrate):
+        raise ValueError(f"Bitrates look like 2500k or 5M, not {max_bitrate}")
+
+    ladder = None
+    if output_format == "hls":
+        top = RESOLUTIONS[resolution][1]
+        ladder = output.get("ladder") or [tier for tier, size in RESOLUTIONS.items() if size[1] <= top]
+        unknown = [tier for tier in ladder if tier not in RESOLUTIONS]
+        if unknown:
+            raise ValueError(f"Unknown resolutions in ladder: {', '.join(unknown)}")
+        # Renditions are scaled down from the slides, never up
+        too_high = [tier for tier in ladder if RESOLUTIONS[tier][1] > top]
+        if too_high:
+            raise ValueError(f"Ladder tiers above the {resolution} resolution: {', '.join(too_high)}")
+        # Highest first
+        ladder = sorted(set(ladder), key=lambda tier: -RESOLUTIONS[tier][1])
+    return {"resolution": resolution, "crf": output.get("crf"), "max_bitrate": max_bitrate,
+            "format": output_format, "ladder": ladder}
+
+
+def output_variant(output=None) -> str:
+    """Suffix that tells results of different output profiles apart; empty for the default."""
+    output = normalize_output(output)
+    parts = []
+    if output["resolution"] != DEFAULT_RESOLUTION:
+        parts.append(output["resolution"])
+    if output["crf"] is not None:
+        parts.append(f"crf{output['crf']}")
+    if output["max_bitrate"]:
+        parts.append(output["max_bitrate"])
+    if output["format"] == "hls":
+        parts.append("hls")
+        if output["ladder"] != normalize_output({"resolution": output["resolution"], "format": "hls"})["ladder"]:
+            parts.append("-".join(output["ladder"]))
+    return "".join(f"_{part}" for part in parts)
+
+
+def slide_size(output=None) -> tuple:
+    """Size the slides are composed at: the largest size any rendition needs."""
+    return RESOLUTIONS[normalize_output(output)["resolution"]]
+
+
+def scale_bitrate(rate: str, factor: float) -> str:
+    """scale_bitrate("2500k", 2) == "5000k"."""
+    return f"{int(int(rate[:-1]) * factor)}{rate[-1]}"
+
+
+def rendition_bitrate(tier: str, max_bitrate=None) -> str:
+    """Peak bitrate of an HLS rendition, capped by the requested max_bitrate."""
+    default = HLS_BITRATES[tier]
+    if not max_bitrate:
+        return default
+    to_kbps = lambda rate: int(rate[:-1]) * (1000 if rate[-1] == "M" else 1)
+    return default if to_kbps(default) <= to_kbps(max_bitrate) else f"{to_kbps(max_bitrate)}k"
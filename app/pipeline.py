@@ -0,0 +1,542 @@
+import asyncio
+import inspect
+import json
+import logging
+import os
+import time
+import aiofiles
+from concurrent.futures.process import BrokenProcessPool
+from decouple import config
+from fastapi import HTTPException
+from app.script_generation import fetch_script_from_gemini, stream_script_from_gemini, ScriptGenerationError
+from app.voiceover_generation import process_voiceovers, generate_voiceover_async
+from app.image_generation import process_images, generate_image_async
+from app.video_assembly import (ASSEMBLY_MODE, RENDER_WORKERS, VideoAssemblyError, assemble_video, compose_slide,
+                                concat_stream, concatenate_clips, encode_hls, encode_single_pass, encode_slide,
+                                get_render_pool, image_slot_size, make_slide_spec, shutdown_render_pool)
+from app import metrics
+from app.manifest import Manifest
+from app.output_profiles import normalize_output, slide_size
+from app.upload import (BUCKET_NAME, delete_from_gcs, upload_directory_to_gcs, upload_stream_to_gcs, upload_to_gcs,
+                        video_blob_name, video_name)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Start voiceovers and images per script section while Gemini is still streaming
+SCRIPT_STREAMING = config("SCRIPT_STREAMING", default=True, cast=bool)
+
+# "dag" renders each slide as soon as its assets land; "staged" waits for all
+# assets and then runs assemble_video
+PIPELINE_MODE = config("PIPELINE_MODE", default="dag")
+
+# Upload the joined clips while ffmpeg is still writing them (fragmented MP4);
+# not used for HLS outputs, which are uploaded as a directory
+UPLOAD_STREAMING = config("UPLOAD_STREAMING", default=False, cast=bool)
+
+# Concurrency per pipeline stage; stages without a limit rely on the
+# per-upstream caps in app.clients
+STAGE_LIMITS = {
+    "slide": config("SLIDE_STAGE_LIMIT", default=RENDER_WORKERS, cast=int),
+    "encode": config("ENCODE_STAGE_LIMIT", default=RENDER_WORKERS, cast=int),
+    "concat": config("CONCAT_STAGE_LIMIT", default=2, cast=int),
+    "upload": config("UPLOAD_STAGE_LIMIT", default=2, cast=int),
+}
+
+# Slide steps a render farm can hand to any worker (see app.render_worker)
+RENDER_TASKS = {"compose_slide": compose_slide, "encode_slide": encode_slide}
+TASK_POLL_INTERVAL = config("TASK_POLL_INTERVAL", default=0.2, cast=float)
+
+_stage_semaphores = {}
+_task_store = None
+
+
+class Scheduler:
+    """Small dependency-graph scheduler for one job.
+
+    Each node starts as soon as all of its dependencies have finished and a
+    slot in its stage is free. Stage slots are shared by every job on the
+    event loop. Every node records when it became ready, started and
+    finished, which ``trace`` turns into a timing report with the critical
+    path.
+    """
+
+    def __init__(self, limits=None, job=None):
+        self.limits = STAGE_LIMITS if limits is None else limits
+        self.job = job
+        self.origin = time.perf_counter()
+        self.nodes = {}
+        self.deps = {}
+        self.spans = {}
+
+    def now(self) -> float:
+        return time.perf_counter() - self.origin
+
+    def add(self, name: str, stage: str, func, deps=()):
+        """Schedule func (sync or async, no arguments) after deps complete."""
+        self.deps[name] = list(deps)
+        self.nodes[name] = asyncio.create_task(self._run(name, stage, func, [self.nodes[dep] for dep in deps]))
+        return name
+
+    def record(self, name: str, stage: str, start: float, end: float, deps=()):
+        """Add an already finished node, e.g. work done outside the scheduler."""
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        self.deps[name] = list(deps)
+        self.nodes[name] = future
+        self.spans[name] = {"name": name, "stage": stage, "ready": start, "start": start, "end": end}
+        metrics.observe("stage_seconds", end - start, stage=stage)
+        if self.job is not None:
+            self.job.timings[stage] = round(self.job.timings.get(stage, 0.0) + end - start, 4)
+        return name
+
+    async def _run(self, name, stage, func, dep_tasks):
+        await asyncio.gather(*dep_tasks)
+        ready = self.now()
+        async with self._stage_limit(stage):
+            start = self.now()
+            with metrics.span(stage, self.job, node=name):
+                result = func()
+                if inspect.isawaitable(result):
+                    result = await result
+        self.spans[name] = {"name": name, "stage": stage, "ready": ready, "start": start, "end": self.now()}
+        return result
+
+    def _stage_limit(self, stage):
+        limit = self.limits.get(stage)
+        if not limit:
+            return _NoLimit()
+        key = (stage, id(asyncio.get_running_loop()))
+        if key not in _stage_semaphores:
+            _stage_semaphores[key] = asyncio.Semaphore(limit)
+        return _stage_semaphores[key]
+
+    async def wait(self, name: str):
+        """Wait for a node; on failure every unfinished node is cancelled."""
+        try:
+            return await self.nodes[name]
+        except BaseException:
+            self.cancel()
+            raise
+
+    def cancel(self):
+        for node in self.nodes.values():
+            node.cancel()
+
+    def trace(self) -> dict:
+        spans = sorted(self.spans.values(), key=lambda span: span["start"])
+        stages = {}
+        for span in spans:
+            stage = stages.setdefault(span["stage"], {"count": 0, "busy_seconds": 0.0, "wait_seconds": 0.0,
+                                                      "first_start": span["start"], "last_end": span["end"]})
+            stage["count"] += 1
+            stage["busy_seconds"] += span["end"] - span["start"]
+            stage["wait_seconds"] += span["start"] - span["ready"]
+            stage["last_end"] = max(stage["last_end"], span["end"])
+        return {
+            "spans": [{key: round(value, 4) if isinstance(value, float) else value for key, value in span.items()} for span in spans],
+            "stages": {name: {key: round(value, 4) if isinstance(value, float) else value for key, value in stage.items()}
+                       for name, stage in stages.items()},
+            "critical_path": self.critical_path(),
+        }
+
+    def critical_path(self) -> list:
+        """Walk back from the last node to finish through its latest-finishing dependency."""
+        if not self.spans:
+            return []
+        name = max(self.spans.values(), key=lambda span: span["end"])["name"]
+        path = []
+        while name is not None:
+            path.append(name)
+            finished = [dep for dep in self.deps.get(name, []) if dep in self.spans]
+            name = max(finished, key=lambda dep: self.spans[dep]["end"]) if finished else None
+        return list(reversed(path))
+
+
+class _NoLimit:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def use_task_store(store):
+    """Queue the RENDER_TASKS steps in a shared job store instead of running them here."""
+    global _task_store
+    _task_store = store
+
+async def run_in_render_pool(func, *args):
+    if _task_store is not None and func.__name__ in RENDER_TASKS:
+        return await run_remote_task(func.__name__, *args)
+    return await run_locally(func, *args)
+
+async def run_remote_task(name, *args):
+    """Queue a render step for whichever worker is free and wait for its result.
+
+    The arguments only hold workspace paths, so every worker needs the same
+    WORKSPACE_ROOT (one machine, or a shared filesystem).
+    """
+    task_id = await asyncio.to_thread(_task_store.add_task, name, list(args))
+    try:
+        while True:
+            await asyncio.sleep(TASK_POLL_INTERVAL)
+            task = await asyncio.to_thread(_task_store.get_task, task_id)
+            if task is None:
+                raise VideoAssemblyError(f"Render task {name} disappeared")
+            if task["status"] == "done":
+                return task["result"]
+            if task["status"] == "failed":
+                raise VideoAssemblyError(f"Render task {name} failed: {task['error']}")
+    finally:
+        await asyncio.to_thread(_task_store.delete_task, task_id)
+
+async def run_locally(func, *args):
+    if RENDER_WORKERS <= 1:
+        return await asyncio.to_thread(metrics.run_with_cpu, func, *args)
+    loop = asyncio.get_running_loop()
+    try:
+        future = loop.run_in_executor(get_render_pool(), metrics.run_captured, func, *args)
+    except BrokenProcessPool:
+        shutdown_render_pool()
+        future = loop.run_in_executor(get_render_pool(), metrics.run_captured, func, *args)
+    try:
+        result, samples = await future
+    except BrokenProcessPool as e:
+        # A render process died, e.g. killed for memory; the next call gets a fresh pool
+        shutdown_render_pool()
+        raise VideoAssemblyError(f"Render process died running {func.__name__}: {e}") from e
+    # ffmpeg timings recorded in the worker process
+    metrics.merge(samples)
+    return result
+
+# Async function to save JSON file
+async def save_json_async(filename, data):
+    try:
+        async with aiofiles.open(filename, "w") as file:
+            await file.write(json.dumps(data, indent=4))
+    except Exception as e:
+        logger.error(f"Error saving JSON: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"JSON save error: {str(e)}")
+
+def build_assembly_data(script):
+    title = script.get("title", "No title provided")
+    introduction = script.get("introduction", {})
+    sections = script.get("sections", [])
+    conclusion = script.get("conclusion", {})
+    return {
+        "slides": {
+            "title": title,
+            "introduction": dict(introduction).get("slide_points", []),
+            "sections": [{"heading": dict(sec).get("heading", "No heading"), "slide_points": dict(sec).get("slide_points", [])} for sec in sections],
+        },
+        "conclusion": {"slide_points": dict(conclusion).get("slide_points", [])},
+    }
+
+async def fetch_script_and_assets(topic, workspace, image_size=None):
+    """Fetch the whole script, then start voiceover and image generation."""
+    script = await asyncio.to_thread(fetch_script_from_gemini, topic)
+
+    if "error" in script:
+        raise HTTPException(status_code=500, detail=f"Gemini API error: {script['error']}")
+
+    introduction = script.get("introduction", {})
+    sections = script.get("sections", [])
+    conclusion = script.get("conclusion", {})
+
+    voiceover_texts = []
+    if introduction.get("voiceover"):
+        voiceover_texts.append({"part": "Introduction", "text": introduction["voiceover"]})
+    for i, section in enumerate(sections):
+        if section.get("voiceover"):
+            voiceover_texts.append({"part": f"Section {i+1}", "text": section["voiceover"]})
+    if conclusion.get("voiceover"):
+        voiceover_texts.append({"part": "Conclusion", "text": conclusion["voiceover"]})
+
+    voiceover_task = asyncio.create_task(process_voiceovers(voiceover_texts, output_directory=f"{workspace}/voiceovers"))
+    image_task = asyncio.create_task(process_images([section.get("image_placeholder") for section in [introduction] + sections + [conclusion] if section.get("image_placeholder")], output_directory=f"{workspace}/images", size=image_size))
+    return script, [voiceover_task, image_task]
+
+async def stream_script_and_assets(topic, workspace, image_size=None):
+    """Stream the script and start each slide's voiceover and image as soon as its part arrives."""
+    os.makedirs(f"{workspace}/voiceovers", exist_ok=True)
+    os.makedirs(f"{workspace}/images", exist_ok=True)
+    script = {"sections": []}
+    tasks = []
+
+    def start_assets(part, slide_index):
+        if part.get("voiceover"):
+            tasks.append(asyncio.create_task(generate_voiceover_async(part["voiceover"], f"{workspace}/voiceovers/voiceover_{slide_index}.mp3")))
+        if part.get("image_placeholder"):
+            tasks.append(asyncio.create_task(generate_image_async(part["image_placeholder"], f"{workspace}/images/image_{slide_index}.jpg", image_size)))
+
+    try:
+        async for key, value in stream_script_from_gemini(topic):
+            if key == "introduction":
+                script["introduction"] = value
+                start_assets(value, 1)
+            elif key == "section":
+                script["sections"].append(value)
+                start_assets(value, len(script["sections"]) + 1)
+            elif key == "conclusion":
+                script["conclusion"] = value
+                start_assets(value, len(script["sections"]) + 2)
+            else:
+                script[key] = value
+    except Exception as e:
+        for task in tasks:
+            task.cancel()
+        if isinstance(e, ScriptGenerationError):
+            raise HTTPException(status_code=500, detail=f"Gemini API error: {str(e)}")
+        raise
+    return script, tasks
+
+def output_paths(job):
+    """Local MP4 and HLS directory of a job; the MP4 is the top rendition for HLS outputs."""
+    return f"{job.workspace}/videos/{video_name(job.topic)}_video.mp4", f"{job.workspace}/hls"
+
+def upload_output(output_video_path, hls_dir, destination_blob_name, output):
+    if normalize_output(output)["format"] == "hls":
+        return upload_directory_to_gcs(hls_dir, BUCKET_NAME, os.path.dirname(destination_blob_name))
+    return upload_to_gcs(local_file_path=output_video_path, bucket_name=BUCKET_NAME, destination_blob_name=destination_blob_name)
+
+async def render_video_staged(job):
+    topic = job.topic
+    workspace = job.workspace
+    output = normalize_output(job.output)
+
+    job.update("script", 0.05)
+    image_size = image_slot_size(slide_size(output))
+    with metrics.span("script", job):
+        if SCRIPT_STREAMING:
+            script, asset_tasks = await stream_script_and_assets(topic, workspace, image_size)
+        else:
+            script, asset_tasks = await fetch_script_and_assets(topic, workspace, image_size)
+
+    job.update("voiceovers and images", 0.15)
+    with metrics.span("assets", job):
+        await asyncio.gather(*asset_tasks)
+    assembly_data = build_assembly_data(script)
+
+    assembly_file = f"{workspace}/assembly.json"
+    await save_json_async(assembly_file, assembly_data)
+
+    job.update("assembly", 0.5)
+    output_video_path, hls_dir = output_paths(job)
+    with metrics.span("assembly", job):
+        await asyncio.to_thread(assemble_video, assembly_file=assembly_file, output_video_path=output_video_path, workspace=workspace, output=output)
+    if output["format"] == "hls":
+        job.update("hls renditions", 0.8)
+        with metrics.span("hls", job):
+            await asyncio.to_thread(encode_hls, output_video_path, hls_dir, output)
+
+    job.update("upload", 0.9)
+    destination_blob_name = video_blob_name(topic, output)
+    with metrics.span("upload", job):
+        return await asyncio.to_thread(upload_output, output_video_path, hls_dir, destination_blob_name, output)
+
+async def script_events(topic):
+    """Yield the script as ``(key, value)`` events, streamed when SCRIPT_STREAMING is on."""
+    if SCRIPT_STREAMING:
+        async for event in stream_script_from_gemini(topic):
+            yield event
+        return
+    script = await asyncio.to_thread(fetch_script_from_gemini, topic)
+    if "error" in script:
+        raise ScriptGenerationError(script["error"])
+    async for event in saved_script_events(script):
+        yield event
+
+def stream_concat_upload(clip_paths, list_path, destination_blob_name):
+    """Concatenate the clips straight into GCS without a local output file."""
+    try:
+        with concat_stream(clip_paths, list_path) as stream:
+            return upload_stream_to_gcs(stream, BUCKET_NAME, destination_blob_name)
+    except VideoAssemblyError:
+        # The upload finished with a truncated stream; do not leave it behind
+        delete_from_gcs(BUCKET_NAME, destination_blob_name)
+        raise
+
+async def synthesize_voiceover(text, spec):
+    # Hand the duration from TTS to the encode step so it never probes the MP3
+    spec["duration"] = await generate_voiceover_async(text, spec["voiceover_path"])
+
+async def checkpointed(manifest, stage, inputs, artifacts, func, reused):
+    """Run func unless the manifest already holds valid artifacts for this stage and inputs.
+
+    artifacts is a list of paths, or a callable returning one once func has
+    run, for stages whose output files are only known afterwards. Artifacts
+    are hashed in a thread, so large videos never block the event loop.
+    """
+    if await asyncio.to_thread(manifest.is_valid, stage, inputs):
+        reused.append(stage)
+        return
+    result = func()
+    if inspect.isawaitable(result):
+        await result
+    await asyncio.to_thread(manifest.complete, stage, inputs, artifacts() if callable(artifacts) else artifacts)
+
+def directory_files(directory):
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(directory) for name in names)
+
+async def saved_script_events(script):
+    """Replay a checkpointed script in the same event order as script_events."""
+    for key in ("title", "introduction"):
+        if key in script:
+            yield key, script[key]
+    for section in script.get("sections", []):
+        yield "section", section
+    if "conclusion" in script:
+        yield "conclusion", script["conclusion"]
+
+async def render_video_dag(job):
+    """Run the job as a per-slide dependency graph.
+
+    script part -> voiceover + image -> slide PNG -> clip encode -> concat -> upload
+
+    With ASSEMBLY_MODE=single_pass the per-slide clip encodes are replaced
+    by one encode of the whole video. HLS outputs add one more encode that
+    splits the finished video into the rendition ladder before the upload.
+
+    Stage results are checkpointed in the workspace manifest, so running a
+    failed job again only redoes the stages whose artifacts are missing or
+    stale.
+    """
+    topic = job.topic
+    workspace = job.workspace
+    output = normalize_output(job.output)
+    image_size = image_slot_size(slide_size(output))
+    os.makedirs(f"{workspace}/voiceovers", exist_ok=True)
+    os.makedirs(f"{workspace}/images", exist_ok=True)
+
+    manifest = Manifest(f"{workspace}/manifest.json")
+    scheduler = Scheduler(job=job)
+    script = {"sections": []}
+    specs = []
+    clips = []
+    encoded = []
+    reused = []
+    last_part_at = 0.0
+
+    def add_slide(index, heading, part):
+        nonlocal last_part_at
+        spec = make_slide_spec(index, heading, part.get("slide_points", []), workspace, output=output)
+        script_node = scheduler.record(f"script:{index}", "script", last_part_at, scheduler.now())
+        last_part_at = scheduler.now()
+
+        audio_deps = [script_node]
+        if part.get("voiceover"):
+            audio_deps = [scheduler.add(f"tts:{index}", "tts", lambda: checkpointed(
+                manifest, f"tts:{index}", part["voiceover"], [spec["voiceover_path"]],
+                lambda: synthesize_voiceover(part["voiceover"], spec), reused), [script_node])]
+        image_deps = [script_node]
+        if part.get("image_placeholder"):
+            image_deps = [scheduler.add(f"image:{index}", "image", lambda: checkpointed(
+                manifest, f"image:{index}", [part["image_placeholder"], image_size], [spec["raw_image_path"]],
+                lambda: generate_image_async(part["image_placeholder"], spec["raw_image_path"], image_size), reused), [script_node])]
+        slide_node = scheduler.add(f"slide:{index}", "slide", lambda: checkpointed(
+            manifest, f"slide:{index}", [heading, spec["points"], manifest.artifact_hash(spec["raw_image_path"]), output["resolution"]],
+            [spec["slide_image_path"]], lambda: run_in_render_pool(compose_slide, spec), reused), image_deps)
+
+        specs.append(spec)
+        if ASSEMBLY_MODE == "single_pass":
+            # The whole video is encoded at once after the last slide is ready
+            clips.extend([slide_node] + audio_deps)
+            return
+
+        async def encode():
+            inputs = [manifest.artifact_hash(spec["slide_image_path"]), manifest.artifact_hash(spec["voiceover_path"]), spec["profile"],
+                      output["crf"], output["max_bitrate"]]
+            await checkpointed(manifest, f"clip:{index}", inputs, [spec["slide_video_path"]],
+                               lambda: run_in_render_pool(encode_slide, spec), reused)
+            encoded.append(index)
+            job.update("rendering slides", 0.2 + 0.6 * len(encoded) / max(len(clips), 1))
+
+        clips.append(scheduler.add(f"clip:{index}", "encode", encode, [slide_node] + audio_deps))
+
+    try:
+        job.update("script", 0.05)
+        if await asyncio.to_thread(manifest.is_valid, "script", topic):
+            reused.append("script")
+            events = saved_script_events(manifest.data("script"))
+        else:
+            events = script_events(topic)
+        async for key, value in events:
+            if key == "introduction":
+                script["introduction"] = value
+                add_slide(1, script.get("title", "No title provided"), value)
+            elif key == "section":
+                script["sections"].append(value)
+                add_slide(len(script["sections"]) + 1, value.get("heading", "No heading"), value)
+            elif key == "conclusion":
+                script["conclusion"] = value
+                add_slide(len(script["sections"]) + 2, "The End", value)
+            else:
+                script[key] = value
+        if not clips:
+            raise ScriptGenerationError("The script has no slides")
+        await asyncio.to_thread(manifest.complete, "script", topic, data=script)
+        await save_json_async(f"{workspace}/assembly.json", build_assembly_data(script))
+
+        output_video_path, hls_dir = output_paths(job)
+        os.makedirs(os.path.dirname(output_video_path), exist_ok=True)
+
+        async def concat():
+            clip_paths = [spec["slide_video_path"] for spec in specs]
+            inputs = [manifest.artifact_hash(path) for path in clip_paths]
+            await checkpointed(manifest, "video", inputs, [output_video_path],
+                               lambda: asyncio.to_thread(concatenate_clips, clip_paths, output_video_path), reused)
+            job.update("upload", 0.9)
+
+        async def encode_video():
+            job.update("encoding video", 0.5)
+            inputs = [[manifest.artifact_hash(spec["slide_image_path"]), manifest.artifact_hash(spec["voiceover_path"])]
+                      for spec in specs] + [ASSEMBLY_MODE, output["crf"], output["max_bitrate"]]
+            await checkpointed(manifest, "video", inputs, [output_video_path],
+                               lambda: asyncio.to_thread(encode_single_pass, specs, output_video_path), reused)
+            job.update("upload", 0.9)
+
+        async def hls():
+            job.update("hls renditions", 0.85)
+            inputs = [manifest.artifact_hash(output_video_path), output]
+            # Every playlist and segment, so a resume redoes a partial ladder
+            await checkpointed(manifest, "hls", inputs, lambda: directory_files(hls_dir),
+                               lambda: asyncio.to_thread(encode_hls, output_video_path, hls_dir, output), reused)
+            job.update("upload", 0.9)
+
+        destination_blob_name = video_blob_name(topic, output)
+        if ASSEMBLY_MODE == "single_pass":
+            scheduler.add("video", "encode", encode_video, clips)
+        elif UPLOAD_STREAMING and output["format"] == "mp4":
+            # Concat and upload overlap, so they are a single node
+            async def stream_upload():
+                job.update("upload", 0.85)
+                clip_paths = [spec["slide_video_path"] for spec in specs]
+                return await asyncio.to_thread(stream_concat_upload, clip_paths, f"{output_video_path}.concat.txt",
+                                               destination_blob_name)
+
+            scheduler.add("upload", "upload", stream_upload, clips)
+            return await scheduler.wait("upload")
+        else:
+            scheduler.add("video", "concat", concat, clips)
+        upload_deps = ["video"]
+        if output["format"] == "hls":
+            upload_deps = [scheduler.add("hls", "encode", hls, ["video"])]
+        scheduler.add("upload", "upload", lambda: asyncio.to_thread(
+            upload_output, output_video_path, hls_dir, destination_blob_name, output), upload_deps)
+        return await scheduler.wait("upload")
+    except ScriptGenerationError as e:
+        scheduler.cancel()
+        raise HTTPException(status_code=500, detail=f"Gemini API error: {str(e)}")
+    except BaseException:
+        scheduler.cancel()
+        raise
+    finally:
+        job.trace = scheduler.trace()
+        job.trace["reused"] = reused
+
+async def run_video_job(job):
+    if PIPELINE_MODE == "staged":
+        return await render_video_staged(job)
+    return await render_video_dag(job)
@@ -0,0 +1,101 @@
+"""Render farm worker: claims video jobs and slide render tasks from the shared job store.
+
+Start the API with JOB_STORE set (it then only queues and reports jobs)
+and any number of these next to it, on one machine or on several that
+share WORKSPACE_ROOT:
+
+    JOB_STORE=sqlite:///cache/jobs.db python -m app.render_worker
+"""
+import asyncio
+import logging
+import signal
+from decouple import config
+from app import clients
+from app.jobs import HEARTBEAT_INTERVAL, MAX_CONCURRENT_JOBS, JobManager
+from app.job_store import HEARTBEAT_TIMEOUT, get_job_store
+from app.pipeline import RENDER_TASKS, TASK_POLL_INTERVAL, run_locally, run_video_job, use_task_store
+from app.result_cache import create_result_cache
+from app.video_assembly import RENDER_WORKERS, shutdown_render_pool
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Jobs this worker runs at once, and slide tasks it takes from any job
+RENDER_WORKER_JOBS = config("RENDER_WORKER_JOBS", default=MAX_CONCURRENT_JOBS, cast=int)
+RENDER_WORKER_TASKS = config("RENDER_WORKER_TASKS", default=RENDER_WORKERS, cast=int)
+# Hand slide compose/encode steps to every worker instead of the job's own
+DISTRIBUTED_RENDER = config("DISTRIBUTED_RENDER", default=True, cast=bool)
+
+
+async def task_heartbeat(store, task_id, worker_id):
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        await asyncio.to_thread(store.task_heartbeat, task_id, worker_id)
+
+
+async def run_tasks(store, worker_id):
+    """Run queued slide tasks on the local render pool."""
+    while True:
+        try:
+            claimed = await asyncio.to_thread(store.claim_task, worker_id)
+        except Exception as e:
+            # A lost store connection or a broken task record must not end this task slot
+            logger.error(f"Could not claim a render task: {str(e)}")
+            claimed = None
+        if claimed is None:
+            await asyncio.sleep(TASK_POLL_INTERVAL)
+            continue
+        task_id, name, args = claimed
+        heartbeat = asyncio.create_task(task_heartbeat(store, task_id, worker_id))
+        try:
+            result = await run_locally(RENDER_TASKS[name], *args)
+            await asyncio.to_thread(store.finish_task, task_id, result)
+        except Exception as e:
+            logger.error(f"Render task {name} failed: {str(e)}")
+            await asyncio.to_thread(store.finish_task, task_id, None, str(e))
+        finally:
+            heartbeat.cancel()
+
+
+async def release_stale(store):
+    """Requeue jobs and tasks of workers that died. Every worker does this; claims stay exclusive."""
+    while True:
+        await asyncio.sleep(HEARTBEAT_TIMEOUT / 2)
+        try:
+            await asyncio.to_thread(store.release_stale, HEARTBEAT_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Could not release stale jobs: {str(e)}")
+
+
+async def main():
+    store = get_job_store()
+    if store is None:
+        raise SystemExit("Set JOB_STORE (e.g. sqlite:///cache/jobs.db) to run a render worker.")
+    await clients.startup()
+    if DISTRIBUTED_RENDER:
+        use_task_store(store)
+
+    manager = JobManager(run_video_job, max_workers=RENDER_WORKER_JOBS, result_cache=create_result_cache(index=store), store=store)
+    await manager.start()
+    background = [asyncio.create_task(run_tasks(store, manager.worker_id)) for _ in range(RENDER_WORKER_TASKS)]
+    background.append(asyncio.create_task(release_stale(store)))
+    logger.info(f"Render worker {manager.worker_id}: {RENDER_WORKER_JOBS} job slots, {RENDER_WORKER_TASKS} task slots.")
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    await stopping.wait()
+
+    logger.info(f"Render worker {manager.worker_id} stopping.")
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    await manager.stop()
+    shutdown_render_pool()
+    clients.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
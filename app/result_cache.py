@@ -0,0 +1,129 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from decouple import config
+from app.output_profiles import output_variant
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Finished videos are reused for this long before a topic is rendered again
+RESULT_CACHE_ENABLED = config("RESULT_CACHE_ENABLED", default=True, cast=bool)
+RESULT_CACHE_PATH = config("RESULT_CACHE_PATH", default="cache/results.json")
+RESULT_CACHE_TTL = config("RESULT_CACHE_TTL", default=7 * 24 * 3600, cast=int)
+RESULT_CACHE_CHECK_GCS = config("RESULT_CACHE_CHECK_GCS", default=True, cast=bool)
+
+
+# Dropped from the ends of a topic; punctuation inside it, as in "C++" or
+# "C#", tells topics apart and is kept
+TOPIC_TRIM = ".,;:!?'\"` "
+
+
+def normalize_topic(topic: str) -> str:
+    """Cache key for a topic: case, spacing and surrounding punctuation do not matter."""
+    topic = " ".join(topic.lower().split())
+    return topic.strip(TOPIC_TRIM) or topic
+
+
+def result_key(topic: str, output=None) -> str:
+    """Cache key for a video: the normalized topic plus its output profile, if not the default.
+
+    The two are joined by a tab, which normalize_topic never leaves in a
+    topic, so "solar system 1080p" and "solar system" at 1080p differ.
+    """
+    variant = output_variant(output)
+    key = normalize_topic(topic)
+    return f"{key}\t{variant.lstrip('_')}" if variant else key
+
+
+class ResultCache:
+    """Maps normalized topics and output profiles to finished video URLs, with a TTL.
+
+    Entries live in a small JSON index on disk, or with a shared ``index``
+    (a job store from app.job_store) in that store, so the API and every
+    render worker see each other's results instead of overwriting one file.
+    On an index miss an optional ``remote_lookup(topic, max_age_seconds,
+    output=...)`` callable, e.g. a GCS existence check, is consulted and its
+    answer is written back to the index.
+    """
+
+    def __init__(self, path: str, ttl: int, remote_lookup=None, index=None):
+        self.path = path
+        self.ttl = ttl
+        self.remote_lookup = remote_lookup
+        self.index = index
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.entries = self._load() if index is None else {}
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable result cache {self.path}: {str(e)}")
+            return {}
+
+    def _save(self):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump(self.entries, file, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def lookup(self, topic: str, output=None):
+        """Return a cached video URL for topic or None. May block on the remote lookup."""
+        key = result_key(topic, output)
+        shared = self.index.get_result(key) if self.index is not None else None
+        with self.lock:
+            entry = shared or self.entries.get(key)
+            if entry and time.time() - entry["created_at"] <= self.ttl:
+                self.hits += 1
+                return entry["video_url"]
+
+        video_url = None
+        if self.remote_lookup is not None:
+            try:
+                video_url = self.remote_lookup(topic, self.ttl, output=output)
+            except Exception as e:
+                logger.warning(f"Remote result lookup failed for '{topic}': {str(e)}")
+        with self.lock:
+            if video_url:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if video_url:
+            self.store(topic, video_url, output)
+        return video_url
+
+    def store(self, topic: str, video_url: str, output=None):
+        if self.index is not None:
+            self.index.put_result(result_key(topic, output), video_url, self.ttl)
+            return
+        with self.lock:
+            self.entries[result_key(topic, output)] = {"video_url": video_url, "created_at": time.time()}
+            now = time.time()
+            self.entries = {key: entry for key, entry in self.entries.items() if now - entry["created_at"] <= self.ttl}
+            self._save()
+
+    def stats(self) -> dict:
+        entries = self.index.count_results() if self.index is not None else None
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries) if entries is None else entries}
+
+
+def create_result_cache(index=None):
+    """The result cache from settings, or None when it is disabled. Pass the job store as index to share it."""
+    if not RESULT_CACHE_ENABLED:
+        return None
+    from app.upload import find_uploaded_video
+    return ResultCache(RESULT_CACHE_PATH, RESULT_CACHE_TTL, find_uploaded_video if RESULT_CACHE_CHECK_GCS else None,
+                       index=index)
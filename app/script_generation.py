@@ -1,22 +1,18 @@
-import google.generativeai as genai
 import json
 import logging
 import re
-from decouple import config
+from app.clients import get_client, upstream_call, upstream_call_async
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure Gemini API
-genai.configure(api_key=config("SCRIPT_KEY"))
+class ScriptGenerationError(Exception):
+    pass
 
-def fetch_script_from_gemini(topic: str) -> dict:
-    try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-
-        # Original Prompt (No Modifications)
-        prompt = f"""
+def build_script_prompt(topic: str) -> str:
+    # Original Prompt (No Modifications)
+    return f"""
             Create an educational script about the topic '{topic}'.
             Everything should be educational.
 
@@ -77,7 +73,14 @@ def fetch_script_from_gemini(topic: str) -> dict:
                 Ensure the response contains only valid JSON and nothing else.
         """
 
-        response = model.generate_content(prompt)
+def fetch_script_from_gemini(topic: str) -> dict:
+    try:
+        model = get_client("gemini")
+
+        prompt = build_script_prompt(topic)
+
+        with upstream_call("gemini"):
+            response = model.generate_content(prompt)
 
         script_text = response.text.strip()  # Ensure no extra whitespace
         logger.info(f"Raw response from Gemini:\n{script_text}")  # Debugging
@@ -98,3 +101,115 @@ def fetch_script_from_gemini(topic: str) -> dict:
     except Exception as e:
         logger.error(f"Error fetching script from Gemini: {str(e)}")
         return {"error": str(e)}
+
+
+class IncrementalScriptParser:
+    """Incremental JSON scanner for the streamed script.
+
+    Text is fed in arbitrary chunks. As soon as a top-level value of the
+    script object is complete it is emitted as ``(key, value)``; entries of
+    the ``sections`` array are emitted one by one as ``("section", value)``.
+    Anything before the first ``{`` (such as a Markdown code fence) is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.expect_key = False
+        self.key = None
+        self.string_start = None
+        self.value_start = None
+        self.section_start = None
+        self.done = False
+
+    def feed(self, text: str) -> list:
+        self.buffer += text
+        events = []
+        while self.pos < len(self.buffer) and not self.done:
+            char = self.buffer[self.pos]
+            depth = len(self.stack)
+            if depth == 0 and char != "{":
+                # Skip code fences or prose before the JSON object
+                self.pos += 1
+                continue
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if depth == 1:
+                        if self.expect_key:
+                            self.key = json.loads(self.buffer[self.string_start:self.pos + 1])
+                        else:
+                            events.append(self._complete_value(self.pos + 1))
+            elif char == '"':
+                self.in_string = True
+                self.string_start = self.pos
+                self._start_value(depth)
+            elif char in "{[":
+                if depth == 0:
+                    self.expect_key = True
+                elif depth >= 1:
+                    self._start_value(depth)
+                    if depth == 2 and self.key == "sections" and char == "{":
+                        self.section_start = self.pos
+                self.stack.append(char)
+            elif char in "}]":
+                if not self.stack:
+                    raise ScriptGenerationError("Unbalanced JSON in script stream")
+                if depth == 1 and self.value_start is not None:
+                    events.append(self._complete_value(self.pos))
+                self.stack.pop()
+                if depth == 3 and self.key == "sections" and self.section_start is not None:
+                    events.append(("section", json.loads(self.buffer[self.section_start:self.pos + 1])))
+                    self.section_start = None
+                elif depth == 2 and self.value_start is not None:
+                    events.append(self._complete_value(self.pos + 1))
+                elif depth == 1:
+                    self.done = True
+            elif depth == 1:
+                if char == ":":
+                    self.expect_key = False
+                elif char == ",":
+                    if self.value_start is not None:
+                        events.append(self._complete_value(self.pos))
+                    self.expect_key = True
+                elif not char.isspace():
+                    self._start_value(depth)
+            self.pos += 1
+        return [event for event in events if event is not None]
+
+    def _start_value(self, depth: int):
+        if depth == 1 and not self.expect_key and self.value_start is None:
+            self.value_start = self.pos
+
+    def _complete_value(self, end: int):
+        key, start = self.key, self.value_start
+        self.value_start = None
+        if start is None or key == "sections":
+            return None
+        return (key, json.loads(self.buffer[start:end].strip()))
+
+async def stream_script_from_gemini(topic: str):
+    """Stream the script, yielding ``(key, value)`` events as parts complete.
+
+    Keys are ``title``, ``introduction``, ``section`` (once per section, in
+    order) and ``conclusion``.
+    """
+    parser = IncrementalScriptParser()
+    try:
+        async with upstream_call_async("gemini"):
+            response = await get_client("gemini").generate_content_async(build_script_prompt(topic), stream=True)
+            async for chunk in response:
+                for event in parser.feed(chunk.text):
+                    yield event
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid JSON in streamed response from Gemini: {e}")
+        raise ScriptGenerationError("Invalid JSON response from Gemini API") from e
+    if not parser.done:
+        raise ScriptGenerationError("Incomplete JSON response from Gemini API")
@@ -1,3 +1,29 @@
+const POLL_INTERVAL_MS = 3000;
+
+function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+async function waitForJob(statusUrl, outputElement) {
+    while (true) {
+        const response = await fetch(statusUrl);
+        const job = await response.json();
+
+        if (!response.ok) {
+            throw new Error(job.detail || "Unknown error occurred.");
+        }
+        if (job.status === "completed") {
+            return job;
+        }
+        if (job.status === "failed") {
+            throw new Error(job.error || "Video creation failed.");
+        }
+
+        outputElement.innerText = `Working on it: ${job.stage} (${Math.round(job.progress * 100)}%)`;
+        await sleep(POLL_INTERVAL_MS);
+    }
+}
+
 async function displayInput() {
     const topic = document.getElementById("userInput").value.trim();
     const outputElement = document.getElementById("output");
@@ -20,7 +46,9 @@ async function displayInput() {
         }
 
         const data = await response.json();
-        outputElement.innerHTML = `<a href="${data.video_url}" target="_blank">Watch Video</a>`;
+        outputElement.innerText = "Video queued...";
+        const job = await waitForJob(data.status_url, outputElement);
+        outputElement.innerHTML = `<a href="${job.video_url}" target="_blank">Watch Video</a>`;
     } catch (error) {
         console.error("Error:", error);
         outputElement.innerText = `Error: ${error.message}`;
@@ -0,0 +1,154 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decouple import config
+from fastapi import HTTPException
+from app import clients
+from app.output_profiles import normalize_output, output_variant
+from app.result_cache import normalize_topic
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load Google Cloud Storage bucket name; checked when something is uploaded
+BUCKET_NAME = config("BUCKET", default=None)
+
+# Resumable uploads send the file in chunks of this size (a multiple of 256 KiB)
+UPLOAD_CHUNK_SIZE = config("UPLOAD_CHUNK_SIZE", default=16 * 1024 * 1024, cast=int)
+# Files at least this large are uploaded as parallel parts
+PARALLEL_UPLOAD_THRESHOLD = config("PARALLEL_UPLOAD_THRESHOLD", default=128 * 1024 * 1024, cast=int)
+PARALLEL_UPLOAD_WORKERS = config("PARALLEL_UPLOAD_WORKERS", default=8, cast=int)
+# Point at a local fake GCS server, e.g. http://localhost:4443
+STORAGE_EMULATOR_HOST = config("STORAGE_EMULATOR_HOST", default=None)
+
+def chunk_size():
+    quantum = 256 * 1024
+    return max(quantum, UPLOAD_CHUNK_SIZE // quantum * quantum)
+
+# Content types of the files in an HLS output directory
+CONTENT_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".m4s": "video/iso.segment", ".mp4": "video/mp4"}
+
+def video_name(topic: str) -> str:
+    """File name stem of a topic's videos: a readable slug and a hash of the normalized topic.
+
+    Topics share a name exactly when they share the result cache key, so
+    "C++ basics" and "C basics" do not overwrite each other's videos.
+    """
+    key = normalize_topic(topic)
+    slug = "_".join(re.findall(r"\w+", key))[:60] or "video"
+    return f"{slug}_{hashlib.sha256(key.encode()).hexdigest()[:12]}"
+
+def video_blob_name(topic: str, output=None) -> str:
+    """Blob of the finished video; the HLS master playlist for HLS outputs.
+
+    Every output profile of a topic gets its own directory under the topic's.
+    """
+    name = f"video/{video_name(topic)}/{output_variant(output).lstrip('_') or 'default'}"
+    if normalize_output(output)["format"] == "hls":
+        return f"{name}/master.m3u8"
+    return f"{name}/video.mp4"
+
+def get_bucket(bucket_name, blob_name=None, blob_chunk_size=None):
+    if not bucket_name:
+        raise ValueError("The BUCKET setting is missing")
+    bucket = clients.get_client("gcs").bucket(bucket_name)
+    return bucket if blob_name is None else bucket.blob(blob_name, chunk_size=blob_chunk_size)
+
+def public_url(bucket_name, blob_name):
+    if STORAGE_EMULATOR_HOST:
+        return f"{STORAGE_EMULATOR_HOST.rstrip('/')}/{bucket_name}/{blob_name}"
+    return f"https://storage.googleapis.com/{bucket_name}/{blob_name}"
+
+# Function to upload video to Google Cloud Storage
+def upload_to_gcs(local_file_path, bucket_name, destination_blob_name):
+    """Upload a finished file. Blocking; run it in a thread from async code.
+
+    Files above PARALLEL_UPLOAD_THRESHOLD are sent as concurrent parts,
+    everything else as a chunked resumable upload.
+    """
+    try:
+        blob = get_bucket(bucket_name, destination_blob_name, chunk_size())
+        size = os.path.getsize(local_file_path)
+        with clients.upstream_call("gcs"):
+            if size >= PARALLEL_UPLOAD_THRESHOLD:
+                from google.cloud.storage import transfer_manager
+                transfer_manager.upload_chunks_concurrently(
+                    local_file_path, blob, content_type="video/mp4", chunk_size=max(chunk_size(), 5 * 1024 * 1024),
+                    worker_type=transfer_manager.THREAD, max_workers=PARALLEL_UPLOAD_WORKERS,
+                )
+            else:
+                blob.upload_from_filename(local_file_path, content_type="video/mp4")
+        logger.info(f"File {local_file_path} uploaded to {destination_blob_name} in bucket {bucket_name}.")
+        return public_url(bucket_name, destination_blob_name)
+    except Exception as e:
+        logger.error(f"Error uploading to Cloud Storage: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Upload error: {str(e)}")
+
+def upload_directory_to_gcs(local_dir, bucket_name, destination_prefix):
+    """Upload every file below local_dir in parallel and return the URL of its master.m3u8.
+
+    The playlists are uploaded last, so a player never sees a playlist
+    that points at segments which are not there yet.
+    """
+    try:
+        bucket = get_bucket(bucket_name)
+        files = [os.path.join(root, name) for root, _, names in os.walk(local_dir) for name in names]
+
+        def upload(path):
+            blob_name = f"{destination_prefix}/{os.path.relpath(path, local_dir).replace(os.sep, '/')}"
+            content_type = CONTENT_TYPES.get(os.path.splitext(path)[1], "application/octet-stream")
+            with clients.upstream_call("gcs"):
+                bucket.blob(blob_name).upload_from_filename(path, content_type=content_type)
+
+        media = [path for path in files if not path.endswith(".m3u8")]
+        playlists = [path for path in files if path.endswith(".m3u8")]
+        with ThreadPoolExecutor(max_workers=PARALLEL_UPLOAD_WORKERS) as executor:
+            list(executor.map(upload, media))
+            list(executor.map(upload, playlists))
+        logger.info(f"{len(files)} files from {local_dir} uploaded to {destination_prefix} in bucket {bucket_name}.")
+        return public_url(bucket_name, f"{destination_prefix}/master.m3u8")
+    except Exception as e:
+        logger.error(f"Error uploading to Cloud Storage: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Upload error: {str(e)}")
+
+def upload_stream_to_gcs(stream, bucket_name, destination_blob_name):
+    """Upload from a readable stream of unknown length with a chunked resumable upload.
+
+    Used to send the encoder output while it is still being written. A pipe
+    cannot tell() its position, which upload_from_file needs, so the stream
+    is copied into a blob writer instead. The writer is only closed, and the
+    upload finalized, once the stream has been read to the end.
+    """
+    try:
+        blob = get_bucket(bucket_name, destination_blob_name, chunk_size())
+        with clients.upstream_call("gcs"):
+            writer = blob.open("wb", chunk_size=chunk_size(), content_type="video/mp4")
+            shutil.copyfileobj(stream, writer, chunk_size())
+            writer.close()
+        logger.info(f"Stream uploaded to {destination_blob_name} in bucket {bucket_name}.")
+        return public_url(bucket_name, destination_blob_name)
+    except Exception as e:
+        logger.error(f"Error uploading stream to Cloud Storage: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Upload error: {str(e)}")
+
+def delete_from_gcs(bucket_name, blob_name):
+    try:
+        with clients.upstream_call("gcs"):
+            get_bucket(bucket_name, blob_name).delete()
+    except Exception as e:
+        logger.warning(f"Could not delete {blob_name}: {str(e)}")
+
+def find_uploaded_video(topic, max_age_seconds, bucket_name=BUCKET_NAME, output=None):
+    """Return the URL of an already uploaded video for topic and output profile, if it is fresh enough."""
+    with clients.upstream_call("gcs"):
+        blob = get_bucket(bucket_name).get_blob(video_blob_name(topic, output))
+    if blob is None or blob.updated is None:
+        return None
+    if time.time() - blob.updated.timestamp() > max_age_seconds:
+        return None
+    return public_url(bucket_name, blob.name)
@@ -1,85 +1,245 @@
 import os
 import json
+import shutil
+import math
+import multiprocessing
 import subprocess
-from PIL import Image, ImageDraw, ImageFont, ImageOps
-from pydub import AudioSegment
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from decouple import config
+from app import metrics
+from app.audio_probe import AudioProbeError, probe_duration
+from app.file_cache import replace_atomically
+from app.output_profiles import (HLS_SEGMENT_SECONDS, RESOLUTIONS, normalize_output, rendition_bitrate,
+                                 scale_bitrate, slide_size)
+
+# Number of processes used to compose and encode slide clips
+RENDER_WORKERS = config("RENDER_WORKERS", default=os.cpu_count() or 1, cast=int)
+# How render processes are started: forkserver or spawn
+RENDER_START_METHOD = config("RENDER_START_METHOD", default="forkserver")
+
+# Encode profiles for slide clips. A slide is one static image, so low frame
+# rates, x264's stillimage tuning and long GOPs cost nothing visually.
+ENCODE_PROFILES = {
+    "standard": {"fps": 25, "preset": "medium", "tune": None, "crf": 23, "gop": 250, "audio_bitrate": "128k"},
+    "still": {"fps": 5, "preset": "veryfast", "tune": "stillimage", "crf": 23, "gop": 50, "audio_bitrate": "128k"},
+    "fast": {"fps": 2, "preset": "ultrafast", "tune": "stillimage", "crf": 26, "gop": 20, "audio_bitrate": "96k"},
+}
+SLIDE_PROFILE = config("SLIDE_PROFILE", default="still")
+
+# Audio parameters shared by every clip
+CLIP_AUDIO_RATE = config("CLIP_AUDIO_RATE", default=44100, cast=int)
+
+# auto, copy or reencode; see concatenate_clips
+CONCAT_MODE = config("CONCAT_MODE", default="auto")
+
+# clips or single_pass; see assemble_video
+ASSEMBLY_MODE = config("ASSEMBLY_MODE", default="clips")
+
+# Slide fonts, resolved by Pillow from the working directory or system font paths
+HEADING_FONT = config("HEADING_FONT", default="arial.ttf")
+TEXT_FONT = config("TEXT_FONT", default="arialbd.ttf")
+
+# Where the generated image goes on a 1280x720 slide (left, top, right, bottom)
+IMAGE_AREA = (650, 100, 1230, 650)
+# JPEG quality of generated images once they are fitted to the image area
+SLIDE_IMAGE_QUALITY = config("SLIDE_IMAGE_QUALITY", default=90, cast=int)
+# Heading bands kept per render process; each is a full-width strip of the slide
+SLIDE_TEMPLATE_CACHE_SIZE = config("SLIDE_TEMPLATE_CACHE_SIZE", default=32, cast=int)
+
+_render_pool = None
+
+class VideoAssemblyError(Exception):
+    pass
+
+@lru_cache(maxsize=None)
+def get_font(name, size):
+    """Load a font face once per process; falls back to Pillow's default font."""
+    from PIL import ImageFont
+
+    try:
+        return ImageFont.truetype(name, size)
+    except IOError:
+        return ImageFont.load_default(size)
+
+@lru_cache(maxsize=8192)
+def text_width(font, text):
+    # Glyph metrics only; nothing is rasterized
+    return font.getlength(text)
 
 def wrap_text(text, font, max_width):
-    words = text
+    """Split text (a string or a list of words) into lines no wider than max_width."""
+    words = text.split() if isinstance(text, str) else text
+    space_width = text_width(font, " ")
     lines = []
     current_line = ""
+    current_width = 0
     for word in words:
-        test_line = current_line + " " + word if current_line else word
-        temp_img = Image.new("RGB", (1000, 100), color="white")
-        temp_draw = ImageDraw.Draw(temp_img)
-        temp_draw.text((0, 0), test_line, font=font, fill="black")
-        bbox = temp_img.getbbox()
-        textwidth = bbox[2] if bbox else 0
-        if textwidth <= max_width:
-            current_line = test_line
+        word_width = text_width(font, word)
+        if current_line and current_width + space_width + word_width <= max_width:
+            current_line += " " + word
+            current_width += space_width + word_width
         else:
-            lines.append(current_line)
+            if current_line:
+                lines.append(current_line)
             current_line = word
+            current_width = word_width
     lines.append(current_line)
     return lines
 
 def get_audio_duration(audio_path):
     try:
-        audio = AudioSegment.from_mp3(audio_path)
-        return len(audio) / 1000.0
-    except Exception as e:
-        print(f"Error getting audio duration: {e}")
-        return 5.0
+        return probe_duration(audio_path)
+    except AudioProbeError as e:
+        raise VideoAssemblyError(f"Error getting audio duration: {e}") from e
+
+def get_encode_profile(profile=None):
+    name = profile or SLIDE_PROFILE
+    if name not in ENCODE_PROFILES:
+        raise ValueError(f"Unknown encode profile: {name}")
+    return ENCODE_PROFILES[name]
 
-def create_slide_video(image_path, voiceover_path, output_video_path, duration):
+def rate_control(settings, crf=None, max_bitrate=None):
+    """x264 quality arguments: the profile's CRF unless overridden, capped at max_bitrate."""
+    args = ["-crf", str(settings["crf"] if crf is None else crf)]
+    if max_bitrate:
+        # Two seconds of VBV buffer keeps the peaks close to the cap
+        args.extend(["-maxrate", max_bitrate, "-bufsize", scale_bitrate(max_bitrate, 2)])
+    return args
+
+def create_slide_video(image_path, voiceover_path, output_video_path, duration, profile=None, crf=None, max_bitrate=None):
+    settings = get_encode_profile(profile)
     try:
         command = [
             "ffmpeg", "-y",
-            "-loop", "1", "-i", image_path,
+            "-loop", "1", "-framerate", str(settings["fps"]), "-i", image_path,
             "-i", voiceover_path,
-            "-c:v", "libx264", "-t", str(duration),
-            "-pix_fmt", "yuv420p", output_video_path
+            "-c:v", "libx264", "-preset", settings["preset"],
         ]
-        subprocess.run(command, check=True)
+        if settings["tune"]:
+            command.extend(["-tune", settings["tune"]])
+        command.extend(rate_control(settings, crf, max_bitrate))
+        command.extend([
+            "-g", str(settings["gop"]),
+            "-t", str(duration),
+            "-pix_fmt", "yuv420p",
+            # Identical stream parameters on every clip allow a stream-copy concat
+            "-r", str(settings["fps"]),
+            "-c:a", "aac", "-b:a", settings["audio_bitrate"], "-ar", str(CLIP_AUDIO_RATE), "-ac", "2",
+            output_video_path
+        ])
+        metrics.run_ffmpeg(command, "slide_clip")
         return output_video_path
     except subprocess.CalledProcessError as e:
         print(f"Error creating slide video: {e}")
         return None
 
-def create_structured_slide_image(heading, image_path, output_path, points, slide_index):
+def scaled(value, size):
+    # The slide layout is designed for 1280x720 and scaled to the output size
+    return max(1, round(value * size[0] / 1280))
+
+def image_area(size=(1280, 720)):
+    return tuple(scaled(value, size) for value in IMAGE_AREA)
+
+def image_slot_size(size=(1280, 720)):
+    """Pixel size the generated image is shown at on a slide of the given size."""
+    left, top, right, bottom = image_area(size)
+    return right - left, bottom - top
+
+def fit_image(image, size):
+    """Scale and center-crop an opened image to exactly size, like ImageOps.fit.
+
+    JPEG sources are decoded at a reduced scale with draft(), and
+    reducing_gap lets resize() shrink by an integer factor with reduce()
+    first, so LANCZOS only ever runs on a small image.
+    """
+    from PIL import Image
+
+    def crop_box(width, height):
+        crop_width, crop_height = min(width, height * size[0] / size[1]), min(height, width * size[1] / size[0])
+        return ((width - crop_width) / 2, (height - crop_height) / 2, (width + crop_width) / 2, (height + crop_height) / 2)
+
+    left, top, right, bottom = crop_box(*image.size)
+    image.draft("RGB", (math.ceil(size[0] * image.size[0] / (right - left)), math.ceil(size[1] * image.size[1] / (bottom - top))))
+    if image.mode not in ("RGB", "RGBA", "L"):
+        image = image.convert("RGBA")
+    return image.resize(size, Image.LANCZOS, box=crop_box(*image.size), reducing_gap=2.0)
+
+def save_slide_image(source, output_path, size):
+    """Fit an image (a path or file object) to size and save it as a compact JPEG.
+
+    Done once when the image is downloaded, so composing a slide only opens
+    a small JPEG instead of decoding the full-resolution original.
+    """
+    from PIL import Image
+
+    with Image.open(source) as image:
+        fitted = fit_image(image, tuple(size))
+    if fitted.mode == "RGBA":
+        # Slides are white, so flattening here looks the same as pasting with the alpha mask
+        background = Image.new("RGB", fitted.size, color="white")
+        background.paste(fitted, mask=fitted.getchannel("A"))
+        fitted = background
+    # output_path may be a hardlink to an image cache entry from an earlier hit
+    with replace_atomically(output_path) as tmp_path:
+        fitted.convert("RGB").save(tmp_path, "JPEG", quality=SLIDE_IMAGE_QUALITY)
+    return output_path
+
+@lru_cache(maxsize=SLIDE_TEMPLATE_CACHE_SIZE)
+def heading_band(heading, size):
+    """The top of a slide: white background, heading and underline. Drawn once per heading and size."""
+    from PIL import Image, ImageDraw
+
+    # Ends where the image area starts
+    band = Image.new("RGB", (size[0], image_area(size)[1]), color="white")
+    draw = ImageDraw.Draw(band)
+    font_heading = get_font(HEADING_FONT, scaled(40, size))
+    heading_x, heading_y = scaled(640, size), scaled(50, size)
+    draw.text((heading_x, heading_y), heading, fill="black", font=font_heading, anchor="mm")
+    # Underline the heading
+    heading_bbox = draw.textbbox((heading_x, heading_y), heading, font=font_heading, anchor="mm")
+    underline_y = heading_bbox[3] + scaled(5, size)  # 5 pixels below the text
+    draw.line([(heading_bbox[0] - scaled(10, size), underline_y), (heading_bbox[2] + scaled(10, size), underline_y)],
+              fill="red", width=scaled(3, size))
+    return band
+
+def create_structured_slide_image(heading, image_path, output_path, points, slide_index, size=(1280, 720)):
+    # Pillow is only loaded by the processes that draw slides
+    from PIL import Image, ImageDraw
+
+    size = tuple(size)
+    px = lambda value: scaled(value, size)
     try:
-        img = Image.new("RGB", (1280, 720), color="white")
+        img = Image.new("RGB", size, color="white")
+        img.paste(heading_band(heading, size), (0, 0))
         draw = ImageDraw.Draw(img)
 
-        # Heading
-        try:
-            font_heading = ImageFont.truetype("arial.ttf", 40)
-        except IOError:
-            font_heading = ImageFont.load_default()
-        heading_x, heading_y = 640, 50
-        draw.text((heading_x, heading_y), heading, fill="black", font=font_heading, anchor="mm")
-        # Underline the heading
-        heading_bbox = draw.textbbox((heading_x, heading_y), heading, font=font_heading, anchor="mm")
-        underline_y = heading_bbox[3] + 5  # 5 pixels below the text
-        draw.line([(heading_bbox[0] - 10, underline_y), (heading_bbox[2] + 10, underline_y)], fill="red", width=3)
-
         # Text Content
-        font_text = ImageFont.truetype("arialbd.ttf", 30)
-        text_x, text_y = 60, 210
+        font_text = get_font(TEXT_FONT, px(30))
+        text_x, text_y = px(60), px(210)
+        text_width_max = px(570)  # Column ends before the image area
+        line_height = px(38)
 
         colors = ["blue", "gold", "green"]
         text_color = colors[(slide_index - 1) % len(colors)] # Calculate color based on slide index.
 
         for point in points:
-            draw.text((text_x, text_y), point, fill=text_color, font=font_text)
-            text_y += 65  # Adjust vertical spacing
+            for line in wrap_text(point, font_text, text_width_max):
+                draw.text((text_x, text_y), line, fill=text_color, font=font_text)
+                text_y += line_height
+            text_y += px(65) - line_height  # Adjust vertical spacing between points
 
         # Image (Right Side)
         if image_path and os.path.exists(image_path):
-            image = Image.open(image_path).convert("RGBA")
-            image_area = (650, 100, 1230, 650)
-            image = ImageOps.fit(image, (image_area[2] - image_area[0], image_area[3] - image_area[1]), Image.LANCZOS)
-            img.paste(image, image_area[:2], image)
+            area = image_area(size)
+            with Image.open(image_path) as image:
+                if image.size != image_slot_size(size):
+                    # Not fitted at download time, e.g. a workspace from before that
+                    image = fit_image(image, image_slot_size(size))
+                img.paste(image, area[:2], image if image.mode == "RGBA" else None)
 
         img.save(output_path)
         return output_path
@@ -88,97 +248,347 @@ def create_structured_slide_image(heading, image_path, output_path, points, slid
         print(f"Error creating structured slide image: {e}")
         return None
 
-def concatenate_clips(clip_paths, output_path):
+def probe_clip(clip_path):
+    """Return the stream parameters that must match for a stream-copy concat."""
+    command = [
+        "ffprobe", "-v", "error",
+        "-show_entries", "stream=codec_type,codec_name,profile,width,height,pix_fmt,r_frame_rate,time_base,sample_rate,channels",
+        "-of", "json", clip_path
+    ]
+    result = subprocess.run(command, check=True, capture_output=True, text=True)
+    streams = json.loads(result.stdout).get("streams", [])
+    return tuple(sorted(tuple(sorted(stream.items())) for stream in streams))
+
+def clips_are_uniform(clip_paths):
+    try:
+        return len({probe_clip(clip_path) for clip_path in clip_paths}) == 1
+    except (subprocess.CalledProcessError, OSError, ValueError) as e:
+        print(f"Could not probe clips, falling back to re-encode: {e}")
+        return False
+
+def write_concat_list(list_path, paths, durations=None):
+    """Write an ffmpeg concat demuxer list, optionally with a duration per entry."""
+    with open(list_path, "w") as file:
+        for i, path in enumerate(paths):
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            file.write(f"file '{escaped}'\n")
+            if durations is not None:
+                file.write(f"duration {durations[i]:.6f}\n")
+        if durations is not None and paths:
+            # The concat demuxer ignores the duration of the last entry unless it is repeated
+            file.write(f"file '{escaped}'\n")
+
+def concatenate_clips_copy(clip_paths, output_path):
+    list_path = f"{output_path}.concat.txt"
+    write_concat_list(list_path, clip_paths)
     try:
-        command = ["ffmpeg", "-y"]
-        for clip_path in clip_paths:
-            command.extend(["-i", clip_path]) # Add each input file separately
-        filter_complex = "".join([f"[{i}:v][{i}:a]" for i in range(len(clip_paths))]) + f"concat=n={len(clip_paths)}:v=1:a=1[v][a]"
-        command.extend(["-filter_complex", filter_complex, "-map", "[v]", "-map", "[a]", "-c:v", "libx264", "-pix_fmt", "yuv420p", output_path])
-        subprocess.run(command, check=True)
+        command = [
+            "ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path,
+            "-c", "copy", "-movflags", "+faststart", output_path
+        ]
+        metrics.run_ffmpeg(command, "concat_copy")
+    finally:
+        os.remove(list_path)
+
+@contextmanager
+def concat_stream(clip_paths, list_path):
+    """Stream-copy concat the clips as fragmented MP4 on a pipe.
+
+    Yields the readable ffmpeg stdout. Raises VideoAssemblyError when ffmpeg
+    fails, so a consumer can discard whatever it already read.
+    """
+    write_concat_list(list_path, clip_paths)
+    command = [
+        "ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy",
+        # Fragmented MP4 needs no seek back to write the moov atom
+        "-movflags", "frag_keyframe+empty_moov+default_base_moof", "-f", "mp4", "pipe:1"
+    ]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    try:
+        yield process.stdout
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        process.stdout.close()
+        returncode = metrics.wait_ffmpeg(process, "concat_stream", start)
+        os.remove(list_path)
+    if returncode != 0:
+        raise VideoAssemblyError(f"Error streaming concatenated clips, ffmpeg exited with {returncode}")
+
+def concatenate_clips_reencode(clip_paths, output_path):
+    command = ["ffmpeg", "-y"]
+    for clip_path in clip_paths:
+        command.extend(["-i", clip_path]) # Add each input file separately
+    filter_complex = "".join([f"[{i}:v][{i}:a]" for i in range(len(clip_paths))]) + f"concat=n={len(clip_paths)}:v=1:a=1[v][a]"
+    command.extend(["-filter_complex", filter_complex, "-map", "[v]", "-map", "[a]", "-c:v", "libx264", "-pix_fmt", "yuv420p",
+                    "-movflags", "+faststart", output_path])
+    metrics.run_ffmpeg(command, "concat_reencode")
+
+def concatenate_clips(clip_paths, output_path, mode=None):
+    """Join slide clips into the final video.
+
+    ``copy`` muxes the clips with the concat demuxer without re-encoding,
+    ``reencode`` runs the concat filter graph and ``auto`` (the default) uses
+    ``copy`` whenever every clip has the same stream parameters.
+    """
+    mode = mode or CONCAT_MODE
+    if mode not in ("auto", "copy", "reencode"):
+        raise ValueError(f"Unknown concat mode: {mode}")
+    try:
+        if mode == "copy" or (mode == "auto" and clips_are_uniform(clip_paths)):
+            concatenate_clips_copy(clip_paths, output_path)
+        else:
+            concatenate_clips_reencode(clip_paths, output_path)
         print(f"Video assembled successfully: {output_path}")
     except subprocess.CalledProcessError as e:
-        print(f"Error concatenating clips: {e}")
+        raise VideoAssemblyError(f"Error concatenating clips: {e}") from e
+
+def make_slide_spec(idx, heading, points, workspace="output", profile=None, output=None):
+    image_folder = f"{workspace}/images"
+    voice_folder = f"{workspace}/voiceovers"
+    return {
+        "index": idx,
+        "heading": heading,
+        "points": points,
+        "raw_image_path": f"{image_folder}/image_{idx}.jpg",
+        "slide_image_path": f"{image_folder}/slide_{idx}.png",
+        "voiceover_path": f"{voice_folder}/voiceover_{idx}.mp3",
+        "slide_video_path": f"{workspace}/slide_{idx}.mp4",
+        "profile": profile,
+        "output": normalize_output(output),
+    }
+
+def build_slide_specs(assembly_data, workspace="output", profile=None, output=None):
+    """Return one render spec per slide, in final video order."""
+    slides = []
+
+    # Introduction Slide (Slide 1), using the title as the heading
+    if "introduction" in assembly_data["slides"]:
+        slides.append(make_slide_spec(1, assembly_data["slides"]["title"], assembly_data["slides"]["introduction"], workspace, profile, output))
+
+    # Body Slides (Slides 2-9)
+    for idx, slide in enumerate(assembly_data["slides"]["sections"], start=2):
+        slides.append(make_slide_spec(idx, slide["heading"], slide["slide_points"], workspace, profile, output))
+
+    # Conclusion Slide (Slide 10)
+    idx = len(assembly_data["slides"]["sections"]) + 2
+    slides.append(make_slide_spec(idx, "The End", assembly_data["conclusion"]["slide_points"], workspace, profile, output))
+    return slides
+
+def compose_slide(slide):
+    """Draw the slide PNG for one slide spec."""
+    slide_image = create_structured_slide_image(
+        heading=slide["heading"],
+        image_path=slide["raw_image_path"],
+        output_path=slide["slide_image_path"],
+        points=slide["points"],
+        slide_index=slide["index"],
+        size=slide_size(slide.get("output")),
+    )
+    if not slide_image:
+        raise VideoAssemblyError(f"Could not create slide image {slide['index']}")
+    return slide_image
+
+def encode_slide(slide):
+    """Encode the composed slide PNG and its voiceover into a clip.
+
+    The voiceover duration is probed unless the TTS step already put it in
+    the spec as ``duration``.
+    """
+    duration = slide.get("duration") or get_audio_duration(slide["voiceover_path"])
+    output = normalize_output(slide.get("output"))
+    slide_video = create_slide_video(slide["slide_image_path"], slide["voiceover_path"], slide["slide_video_path"], duration,
+                                     slide["profile"], output["crf"], output["max_bitrate"])
+    if not slide_video:
+        raise VideoAssemblyError(f"Could not create slide video {slide['index']}")
+    return slide_video
+
+def render_slide(slide):
+    """Compose and encode one slide clip. Runs inside a render worker process."""
+    compose_slide(slide)
+    return encode_slide(slide)
+
+def get_render_pool():
+    global _render_pool
+    if _render_pool is None:
+        # Forked workers could inherit locks held by other threads (metrics,
+        # clients, gRPC) and hang; the forkserver starts them from a clean process
+        _render_pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context(RENDER_START_METHOD))
+    return _render_pool
+
+def shutdown_render_pool(wait=False):
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=wait, cancel_futures=True)
+        _render_pool = None
+
+def render_slides(slides, func=None):
+    """Render all slide clips, fanning out over the render pool.
+
+    Clips are returned in slide order regardless of completion order. The
+    first failure cancels the slides that have not started yet and is raised.
+    func defaults to render_slide; pass compose_slide to only draw the PNGs.
+    """
+    func = func or render_slide
+    if RENDER_WORKERS <= 1 or len(slides) <= 1:
+        return [func(slide) for slide in slides]
 
-def assemble_video(assembly_file, output_video_path):
     try:
-        if not os.path.exists(assembly_file):
-            raise FileNotFoundError(f"Assembly file not found: {assembly_file}")
-        with open(assembly_file, "r") as file:
-            assembly_data = json.load(file)
-        if "slides" not in assembly_data or "conclusion" not in assembly_data:
-            raise KeyError("Missing required keys in JSON data")
-        image_folder = "output/images"
-        voice_folder = "output/voiceovers"
-        temp_video_clips = []
-        os.makedirs(image_folder, exist_ok=True)
-        os.makedirs(voice_folder, exist_ok=True)
-
-        # Introduction Slide (Slide 1)
-        if "introduction" in assembly_data["slides"]:
-            introduction_points = assembly_data["slides"]["introduction"]
-            raw_image_path = f"{image_folder}/image_1.png"
-            slide_image_path = f"{image_folder}/slide_1.png"
-            create_structured_slide_image(
-                heading=assembly_data["slides"]["title"],  # Use the title as the heading
-                image_path=raw_image_path,
-                output_path=slide_image_path,
-                points=introduction_points,
-                slide_index=1 # added slide_index
-            )
-            voiceover_path = f"{voice_folder}/voiceover_1.mp3"
-            duration = get_audio_duration(voiceover_path)
-            slide_video_path = f"output/slide_1.mp4"
-            slide_video = create_slide_video(slide_image_path, voiceover_path, slide_video_path, duration)
-            if slide_video:
-                temp_video_clips.append(slide_video)
-            else:
-                print(f"Error: Could not create introduction video")
-                return
-
-        idx = 2
-        # Body Slides (Slides 2-9)
-        for slide in assembly_data["slides"]["sections"]:
-            raw_image_path = f"{image_folder}/image_{idx}.png"
-            slide_image_path = f"{image_folder}/slide_{idx}.png"
-            create_structured_slide_image(
-                heading=slide["heading"],
-                image_path=raw_image_path,
-                output_path=slide_image_path,
-                points=slide["slide_points"],
-                slide_index=idx # added slide_index
-            )
-            voiceover_path = f"{voice_folder}/voiceover_{idx}.mp3"
-            duration = get_audio_duration(voiceover_path)
-            slide_video_path = f"output/slide_{idx}.mp4"
-            slide_video = create_slide_video(slide_image_path, voiceover_path, slide_video_path, duration)
-            if slide_video:
-                temp_video_clips.append(slide_video)
-            else:
-                print(f"Error: Could not create slide video {idx}")
-                return
-            idx += 1
-
-        # Conclusion Slide (Slide 10)
-        raw_image_path = f"{image_folder}/image_{idx}.png"
-        slide_image_path = f"{image_folder}/slide_{idx}.png"
-        create_structured_slide_image(
-            heading="The End",
-            image_path=raw_image_path,
-            output_path=slide_image_path,
-            points=assembly_data["conclusion"]["slide_points"],
-            slide_index=idx # added slide_index
-        )
-        voiceover_path = f"{voice_folder}/voiceover_{idx}.mp3"
-        duration = get_audio_duration(voiceover_path)
-        slide_video_path = f"output/slide_{idx}.mp4"
-        conclusion_video = create_slide_video(slide_image_path, voiceover_path, slide_video_path, duration)
-        if conclusion_video:
-            temp_video_clips.append(conclusion_video)
-        else:
-            print(f"Error: Could not create conclusion video")
-            return
+        futures = [get_render_pool().submit(metrics.run_captured, func, slide) for slide in slides]
+    except BrokenProcessPool:
+        shutdown_render_pool()
+        futures = [get_render_pool().submit(metrics.run_captured, func, slide) for slide in slides]
 
-        concatenate_clips(temp_video_clips, output_video_path)
-    except Exception as e:
-        print(f"Error assembling video: {e}")
\ No newline at end of file
+    done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+    for future in futures:
+        if future in done and future.exception() is not None:
+            for other in pending:
+                other.cancel()
+            wait(pending)
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                shutdown_render_pool()
+            if isinstance(error, VideoAssemblyError):
+                raise error
+            raise VideoAssemblyError(f"Rendering slide failed: {error}") from error
+    clips = []
+    for future in futures:
+        clip, samples = future.result()
+        # ffmpeg timings recorded in the worker processes
+        metrics.merge(samples)
+        clips.append(clip)
+    return clips
+
+def encode_single_pass(slides, output_path, profile=None):
+    """Encode the whole video with one ffmpeg run and no intermediate clips.
+
+    The composed slide PNGs are fed through a concat list with one duration
+    per slide, the voiceovers are joined on the audio side, and the result
+    is encoded once.
+    """
+    settings = get_encode_profile(profile)
+    output = normalize_output(slides[0].get("output") if slides else None)
+    missing = [slide["voiceover_path"] for slide in slides if not os.path.exists(slide["voiceover_path"])]
+    if missing:
+        raise VideoAssemblyError(f"Missing voiceovers: {', '.join(missing)}")
+    durations = [slide.get("duration") or get_audio_duration(slide["voiceover_path"]) for slide in slides]
+
+    image_list = f"{output_path}.images.txt"
+    audio_list = f"{output_path}.audio.txt"
+    write_concat_list(image_list, [slide["slide_image_path"] for slide in slides], durations)
+    write_concat_list(audio_list, [slide["voiceover_path"] for slide in slides])
+    command = [
+        "ffmpeg", "-y",
+        "-f", "concat", "-safe", "0", "-i", image_list,
+        "-f", "concat", "-safe", "0", "-i", audio_list,
+        "-map", "0:v", "-map", "1:a",
+        "-c:v", "libx264", "-preset", settings["preset"],
+    ]
+    if settings["tune"]:
+        command.extend(["-tune", settings["tune"]])
+    command.extend(rate_control(settings, output["crf"], output["max_bitrate"]))
+    command.extend([
+        "-g", str(settings["gop"]),
+        "-pix_fmt", "yuv420p", "-r", str(settings["fps"]),
+        "-c:a", "aac", "-b:a", settings["audio_bitrate"], "-ar", str(CLIP_AUDIO_RATE), "-ac", "2",
+        "-t", f"{sum(durations):.6f}", "-movflags", "+faststart",
+        output_path
+    ])
+    try:
+        metrics.run_ffmpeg(command, "single_pass")
+        print(f"Video assembled successfully: {output_path}")
+    except subprocess.CalledProcessError as e:
+        raise VideoAssemblyError(f"Error encoding video: {e}") from e
+    finally:
+        os.remove(image_list)
+        os.remove(audio_list)
+    return output_path
+
+def encode_hls(source_path, output_dir, output, profile=None):
+    """Encode the finished MP4 into an HLS ladder of fragmented MP4 renditions.
+
+    One ffmpeg run decodes the source once, splits it into a scaled copy per
+    ladder tier and writes ``<tier>/index.m3u8`` with its segments plus a
+    ``master.m3u8`` that lists them all. Keyframes are forced on segment
+    boundaries so players can switch renditions between any two segments.
+    Returns the master playlist path.
+    """
+    settings = get_encode_profile(profile)
+    output = normalize_output(output)
+    ladder = output["ladder"]
+    # Leftovers of an earlier, partial run would be uploaded with the new ladder
+    shutil.rmtree(output_dir, ignore_errors=True)
+    for tier in ladder:
+        os.makedirs(f"{output_dir}/{tier}", exist_ok=True)
+
+    splits = "".join(f"[v{i}]" for i in range(len(ladder)))
+    filters = [f"[0:v]split={len(ladder)}{splits}"]
+    filters += [f"[v{i}]scale={RESOLUTIONS[tier][0]}:{RESOLUTIONS[tier][1]}[v{i}out]" for i, tier in enumerate(ladder)]
+    command = ["ffmpeg", "-y", "-i", source_path, "-filter_complex", ";".join(filters)]
+    for i in range(len(ladder)):
+        command.extend(["-map", f"[v{i}out]", "-map", "0:a"])
+    command.extend(["-c:v", "libx264", "-preset", settings["preset"]])
+    if settings["tune"]:
+        command.extend(["-tune", settings["tune"]])
+    for i, tier in enumerate(ladder):
+        rate = rendition_bitrate(tier, output["max_bitrate"])
+        command.extend([f"-crf:v:{i}", str(settings["crf"] if output["crf"] is None else output["crf"]),
+                        f"-maxrate:v:{i}", rate, f"-bufsize:v:{i}", scale_bitrate(rate, 2)])
+    command.extend([
+        "-pix_fmt", "yuv420p", "-r", str(settings["fps"]),
+        "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+        "-c:a", "aac", "-b:a", settings["audio_bitrate"], "-ar", str(CLIP_AUDIO_RATE), "-ac", "2",
+        "-f", "hls", "-hls_time", str(HLS_SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+        "-hls_segment_type", "fmp4", "-hls_flags", "independent_segments",
+        "-hls_fmp4_init_filename", "init_%v.mp4",
+        "-hls_segment_filename", f"{output_dir}/%v/segment_%03d.m4s",
+        "-master_pl_name", "master.m3u8",
+        "-var_stream_map", " ".join(f"v:{i},a:{i},name:{tier}" for i, tier in enumerate(ladder)),
+        f"{output_dir}/%v/index.m3u8"
+    ])
+    try:
+        metrics.run_ffmpeg(command, "hls")
+        print(f"HLS renditions written: {output_dir}")
+    except subprocess.CalledProcessError as e:
+        raise VideoAssemblyError(f"Error encoding HLS renditions: {e}") from e
+    return f"{output_dir}/master.m3u8"
+
+def assemble_video(assembly_file, output_video_path, workspace="output", profile=None, mode=None, output=None):
+    """Build the final video from the assembly file.
+
+    ``clips`` (default) encodes one clip per slide in parallel and joins
+    them; ``single_pass`` composes the slides and encodes everything with a
+    single ffmpeg run. ASSEMBLY_MODE sets the default. ``output`` picks the
+    resolution and rate control (see app.output_profiles); for HLS this
+    MP4 is the top rendition that encode_hls then splits into the ladder.
+    """
+    mode = mode or ASSEMBLY_MODE
+    if mode not in ("clips", "single_pass"):
+        raise ValueError(f"Unknown assembly mode: {mode}")
+    if not os.path.exists(assembly_file):
+        raise FileNotFoundError(f"Assembly file not found: {assembly_file}")
+    with open(assembly_file, "r") as file:
+        assembly_data = json.load(file)
+    if "slides" not in assembly_data or "conclusion" not in assembly_data:
+        raise KeyError("Missing required keys in JSON data")
+    os.makedirs(f"{workspace}/images", exist_ok=True)
+    os.makedirs(f"{workspace}/voiceovers", exist_ok=True)
+    os.makedirs(os.path.dirname(output_video_path) or ".", exist_ok=True)
+
+    slides = build_slide_specs(assembly_data, workspace, profile, output)
+    try:
+        if mode == "single_pass":
+            render_slides(slides, compose_slide)
+            encode_single_pass(slides, output_video_path, profile)
+        else:
+            temp_video_clips = render_slides(slides)
+            concatenate_clips(temp_video_clips, output_video_path)
+    except Exception:
+        # Never leave a half-built video behind
+        for path in [output_video_path] + [slide["slide_video_path"] for slide in slides]:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    return output_video_path
@@ -1,7 +1,11 @@
 import asyncio
 import os
 import logging
-from google.cloud import texttospeech
+from decouple import config
+from app import metrics
+from app.audio_probe import AudioProbeError, probe_duration
+from app.clients import get_client, upstream_call
+from app.file_cache import FileCache, cache_key, replace_atomically
 
 # Configure logging
 logging.basicConfig(level=logging.ERROR, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -9,47 +13,97 @@ logging.basicConfig(level=logging.ERROR, format="%(asctime)s - %(levelname)s - %
 # Configure logging
 logging.basicConfig(level=logging.ERROR, format="%(asctime)s - %(levelname)s - %(message)s")
 
-def generate_voiceover(text: str, file_path: str):
-    try:
-        if not text.strip():
-            raise ValueError("Voiceover text cannot be empty.")
+# Voice settings; all of them are part of the cache key
+LANGUAGE_CODE = "en-IN"
+VOICE_NAME = "en-IN-Chirp3-HD-Zephyr"
+AUDIO_ENCODING = "MP3"
+
+# Content-addressed cache of synthesized voiceovers
+TTS_CACHE_ENABLED = config("TTS_CACHE_ENABLED", default=True, cast=bool)
+TTS_CACHE_DIR = config("TTS_CACHE_DIR", default="cache/tts")
+TTS_CACHE_MAX_BYTES = config("TTS_CACHE_MAX_BYTES", default=512 * 1024 * 1024, cast=int)
+
+voiceover_cache = FileCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES, suffix=".mp3") if TTS_CACHE_ENABLED else None
 
-        client = texttospeech.TextToSpeechClient()
+class GoogleTTSBackend:
+    """Synthesizes speech with Google Cloud Text-to-Speech."""
+
+    def synthesize(self, text: str, language_code: str, voice_name: str, audio_encoding: str) -> bytes:
+        from google.cloud import texttospeech
 
         synthesis_input = texttospeech.SynthesisInput(text=text)
 
         voice = texttospeech.VoiceSelectionParams(
-            language_code="en-IN",
-            name="en-IN-Chirp3-HD-Zephyr" # Set the desired voice
+            language_code=language_code,
+            name=voice_name # Set the desired voice
         )
 
         audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3
+            audio_encoding=texttospeech.AudioEncoding[audio_encoding]
         )
 
-        response = client.synthesize_speech(
-            input=synthesis_input, voice=voice, audio_config=audio_config
-        )
+        with upstream_call("tts"):
+            response = get_client("tts").synthesize_speech(
+                input=synthesis_input, voice=voice, audio_config=audio_config
+            )
+        return response.audio_content
+
+tts_backend = GoogleTTSBackend()
 
-        with open(file_path, "wb") as out:
-            out.write(response.audio_content)
-            print(f'Audio content written to "{file_path}"')
+def set_tts_backend(backend):
+    """Swap the TTS backend, e.g. for a local fake. It needs a synthesize() method."""
+    global tts_backend
+    tts_backend = backend
+
+def voiceover_duration(file_path: str):
+    try:
+        return probe_duration(file_path)
+    except AudioProbeError:
+        return None
+
+def generate_voiceover(text: str, file_path: str):
+    """Synthesize text into file_path. Returns the audio duration in seconds, or None on failure."""
+    try:
+        if not text.strip():
+            raise ValueError("Voiceover text cannot be empty.")
+
+        key = cache_key(text, LANGUAGE_CODE, VOICE_NAME, {"audio_encoding": AUDIO_ENCODING})
+        if voiceover_cache and voiceover_cache.fetch(key, file_path):
+            print(f'Cached audio content written to "{file_path}"')
+            return voiceover_duration(file_path)
+
+        audio_content = tts_backend.synthesize(text, LANGUAGE_CODE, VOICE_NAME, AUDIO_ENCODING)
+
+        with replace_atomically(file_path) as tmp_path:
+            with open(tmp_path, "wb") as out:
+                out.write(audio_content)
+        print(f'Audio content written to "{file_path}"')
+
+        if voiceover_cache:
+            voiceover_cache.store(key, file_path)
+
+        # Assembly can use this instead of probing the file again
+        return voiceover_duration(file_path)
 
     except ValueError as ve:
         logging.error(f"Validation Error: {ve}")
     except Exception as e:
-        logging.error(f"Error generating voiceover for text '{text}': {str(e)}")
+        metrics.inc("upstream_failures_total", upstream="tts")
+        # Log the size, not the script text itself
+        logging.error(f"Error generating voiceover ({len(text)} chars) for {file_path}: {str(e)}")
+
+def voiceover_cache_stats() -> dict:
+    return voiceover_cache.stats() if voiceover_cache else {"enabled": False}
 
 async def generate_voiceover_async(text: str, file_path: str):
     loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, generate_voiceover, text, file_path)
+    return await loop.run_in_executor(None, generate_voiceover, text, file_path)
 
-async def process_voiceovers(voiceover_texts: list):
+async def process_voiceovers(voiceover_texts: list, output_directory: str = "output/voiceovers"):
     try:
         if not voiceover_texts:
             raise ValueError("Voiceover texts list cannot be empty.")
-        
-        output_directory = "output/voiceovers"
+
         os.makedirs(output_directory, exist_ok=True)  # Ensure the output folder exists
 
         tasks = []
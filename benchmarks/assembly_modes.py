@@ -0,0 +1,77 @@
+"""Compare the per-slide clip assembly with the single-pass ffmpeg assembly.
+
+Builds a synthetic workspace (slide images and sine-wave voiceovers) and
+runs assemble_video in each mode. Needs ffmpeg on PATH.
+
+    python -m benchmarks.assembly_modes --slides 10 --seconds 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+from PIL import Image
+from app import metrics
+from app.video_assembly import assemble_video, shutdown_render_pool
+
+MODES = ["clips", "single_pass"]
+
+
+def ffmpeg_cpu_seconds():
+    """CPU time of the ffmpeg runs so far, including those of the render processes.
+
+    RUSAGE_CHILDREN would miss the latter: started by a forkserver, they
+    are not children of this process. They hand their samples back instead.
+    """
+    series = metrics.snapshot()["histograms"].get("ffmpeg_cpu_seconds", {})
+    return sum(entry["sum"] for entry in series.values())
+
+
+def make_workspace(workspace, slides, seconds):
+    os.makedirs(f"{workspace}/images", exist_ok=True)
+    os.makedirs(f"{workspace}/voiceovers", exist_ok=True)
+    for idx in range(1, slides + 1):
+        Image.new("RGB", (1024, 1024), color=(idx * 20 % 255, 120, 200)).save(f"{workspace}/images/image_{idx}.jpg")
+        subprocess.run([
+            "ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", f"sine=frequency={200 + idx * 40}:sample_rate=24000",
+            "-t", str(seconds), "-c:a", "libmp3lame", f"{workspace}/voiceovers/voiceover_{idx}.mp3"
+        ], check=True)
+    assembly = {
+        "slides": {
+            "title": "Benchmark",
+            "introduction": ["First point", "Second point"],
+            "sections": [{"heading": f"Section {i}", "slide_points": ["A point", "Another point"]} for i in range(slides - 2)],
+        },
+        "conclusion": {"slide_points": ["Summary"]},
+    }
+    with open(f"{workspace}/assembly.json", "w") as file:
+        json.dump(assembly, file)
+
+
+def run(slides, seconds):
+    results = {}
+    for mode in MODES:
+        with tempfile.TemporaryDirectory() as workspace:
+            make_workspace(workspace, slides, seconds)
+            output_path = f"{workspace}/videos/benchmark.mp4"
+            cpu_start, wall_start = ffmpeg_cpu_seconds(), time.perf_counter()
+            assemble_video(f"{workspace}/assembly.json", output_path, workspace=workspace, mode=mode)
+            wall = time.perf_counter() - wall_start
+            # Every mode starts with a fresh render pool
+            shutdown_render_pool(wait=True)
+            results[mode] = {
+                "wall_seconds": round(wall, 3),
+                "ffmpeg_cpu_seconds": round(ffmpeg_cpu_seconds() - cpu_start, 3),
+                "output_bytes": os.path.getsize(output_path),
+                "intermediate_clips": len([name for name in os.listdir(workspace) if name.endswith(".mp4")]),
+            }
+    return {"slides": slides, "seconds_per_slide": seconds, "modes": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--slides", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.slides, args.seconds), indent=4))
@@ -0,0 +1,62 @@
+"""Compare voiceover duration probing against a full pydub decode.
+
+Needs ffmpeg on PATH, both to create the test MP3 and for pydub.
+
+    python -m benchmarks.audio_duration --seconds 60 --runs 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from pydub import AudioSegment
+from app import audio_probe
+
+
+def make_mp3(path, seconds):
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=24000",
+        "-t", str(seconds), "-c:a", "libmp3lame", "-b:a", "32k", path
+    ], check=True)
+
+
+def pydub_duration(path):
+    return len(AudioSegment.from_mp3(path)) / 1000.0
+
+
+def uncached_probe(path):
+    audio_probe._durations.clear()
+    return audio_probe.probe_duration(path)
+
+
+def measure(func, path, runs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(runs):
+        duration = func(path)
+    elapsed = (time.perf_counter() - start) * 1000 / runs
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"duration_seconds": round(duration, 3), "ms_per_call": round(elapsed, 3), "peak_python_bytes": peak}
+
+
+def run(seconds, runs):
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "voiceover.mp3")
+        make_mp3(path, seconds)
+        return {
+            "audio_seconds": seconds,
+            "pydub_decode": measure(pydub_duration, path, runs),
+            "frame_header_probe": measure(uncached_probe, path, runs),
+            "memoized_probe": measure(audio_probe.probe_duration, path, runs),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.seconds, args.runs), indent=4))
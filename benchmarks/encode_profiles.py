@@ -0,0 +1,64 @@
+"""Compare slide clip encode profiles.
+
+Encodes one synthetic slide per profile and reports the ffmpeg CPU seconds
+spent per minute of output video.
+
+    python -m benchmarks.encode_profiles --seconds 60
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import tempfile
+import time
+from PIL import Image, ImageDraw
+from app.video_assembly import ENCODE_PROFILES, create_slide_video
+
+
+def children_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def make_fixtures(workdir, seconds):
+    image_path = os.path.join(workdir, "slide.png")
+    img = Image.new("RGB", (1280, 720), color="white")
+    draw = ImageDraw.Draw(img)
+    for i in range(4):
+        draw.text((60, 210 + i * 65), f"Benchmark point {i + 1}", fill="blue")
+    draw.rectangle((650, 100, 1230, 650), fill="teal")
+    img.save(image_path)
+
+    audio_path = os.path.join(workdir, "voiceover.mp3")
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=24000",
+        "-t", str(seconds), "-c:a", "libmp3lame", audio_path
+    ], check=True)
+    return image_path, audio_path
+
+
+def run(seconds, profiles):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        image_path, audio_path = make_fixtures(workdir, seconds)
+        for name in profiles:
+            output_path = os.path.join(workdir, f"{name}.mp4")
+            cpu_start, wall_start = children_cpu_seconds(), time.perf_counter()
+            if not create_slide_video(image_path, audio_path, output_path, seconds, profile=name):
+                raise RuntimeError(f"Encoding failed for profile {name}")
+            cpu, wall = children_cpu_seconds() - cpu_start, time.perf_counter() - wall_start
+            results[name] = {
+                "cpu_seconds_per_output_minute": round(cpu * 60 / seconds, 3),
+                "wall_seconds": round(wall, 3),
+                "output_bytes": os.path.getsize(output_path),
+            }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=60.0, help="length of the encoded clip")
+    parser.add_argument("--profiles", nargs="+", default=list(ENCODE_PROFILES), choices=list(ENCODE_PROFILES))
+    args = parser.parse_args()
+    print(json.dumps(run(args.seconds, args.profiles), indent=4))
@@ -0,0 +1,246 @@
+"""Run the whole video pipeline offline against the fakes in benchmarks.fakes.
+
+Every scenario (a slide count and a concurrency level) runs in a fresh
+Python process, so peak RSS and CPU time are its own. The "pipeline"
+target submits jobs to a JobManager exactly like POST /create-video/ and
+waits for them; the "assembly" target runs assemble_video on prepared
+workspaces. Needs ffmpeg on PATH for the encodes.
+
+    python -m benchmarks.end_to_end --slides 5 10 --concurrency 1 4 --jobs 8 --output results.json
+
+Extra settings for the app can be passed as --env PIPELINE_MODE=staged.
+The output is one JSON document meant to be diffed across versions.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))]
+
+
+def usage_report(snapshot):
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    ffmpeg = snapshot["histograms"].get("ffmpeg_cpu_seconds", {})
+    return {
+        "cpu_seconds": round(own.ru_utime + own.ru_stime, 3),
+        # Every ffmpeg run, including those of render processes, from the samples they hand back
+        "ffmpeg_cpu_seconds": round(sum(entry["sum"] for entry in ffmpeg.values()), 3),
+        # Only processes this one started itself. Render processes started by a
+        # forkserver (RENDER_START_METHOD) are not among them, nor their ffmpeg runs.
+        "children_cpu_seconds": round(children.ru_utime + children.ru_stime, 3),
+        "peak_rss_mb": round(own.ru_maxrss / 1024, 1),
+        "children_peak_rss_mb": round(children.ru_maxrss / 1024, 1),
+    }
+
+
+def stage_report(snapshot):
+    histograms = snapshot["histograms"]
+
+    def summarize(series):
+        return {label: {"count": entry["count"], "total_seconds": round(entry["sum"], 3),
+                        "mean_seconds": round(entry["sum"] / entry["count"], 4) if entry["count"] else 0.0}
+                for label, entry in sorted(series.items())}
+
+    return {
+        "stages": summarize(histograms.get("stage_seconds", {})),
+        # CPU of render processes and ffmpeg, charged to the stage that started them
+        "stage_cpu": summarize(histograms.get("stage_cpu_seconds", {})),
+        "upstreams": summarize(histograms.get("upstream_call_seconds", {})),
+        "ffmpeg_wall": summarize(histograms.get("ffmpeg_wall_seconds", {})),
+        "ffmpeg_cpu": summarize(histograms.get("ffmpeg_cpu_seconds", {})),
+    }
+
+
+async def run_pipeline(scenario):
+    from app.jobs import JobManager
+    from app.pipeline import run_video_job
+
+    manager = JobManager(run_video_job, max_workers=scenario["concurrency"], max_queued=scenario["jobs"])
+    await manager.start()
+    start = time.perf_counter()
+    jobs = [await manager.submit(f"benchmark topic {i}") for i in range(scenario["jobs"])]
+    while any(job.finished_at is None for job in jobs):
+        await asyncio.sleep(0.05)
+    wall = time.perf_counter() - start
+    await manager.stop()
+    latencies = [job.finished_at - job.created_at for job in jobs if job.status == "completed"]
+    errors = [job.error for job in jobs if job.status != "completed"]
+    return wall, latencies, errors
+
+
+def make_assembly_workspace(workspace, slides, voiceover_seconds):
+    from app.video_assembly import image_slot_size, save_slide_image
+    from benchmarks.fakes import placeholder_png, silent_mp3
+
+    os.makedirs(f"{workspace}/images", exist_ok=True)
+    os.makedirs(f"{workspace}/voiceovers", exist_ok=True)
+    for idx in range(1, slides + 1):
+        # What the image step leaves behind: the Imagen output fitted to the slide
+        save_slide_image(io.BytesIO(placeholder_png(f"slide {idx}")), f"{workspace}/images/image_{idx}.jpg", image_slot_size())
+        with open(f"{workspace}/voiceovers/voiceover_{idx}.mp3", "wb") as file:
+            file.write(silent_mp3(voiceover_seconds))
+    assembly = {
+        "slides": {
+            "title": "Benchmark",
+            "introduction": ["First point", "Second point"],
+            "sections": [{"heading": f"Section {i + 1}", "slide_points": ["A point", "Another point"]} for i in range(slides - 2)],
+        },
+        "conclusion": {"slide_points": ["Summary"]},
+    }
+    with open(f"{workspace}/assembly.json", "w") as file:
+        json.dump(assembly, file)
+
+
+def run_assembly(scenario, root):
+    from app.video_assembly import assemble_video
+
+    workspaces = []
+    for i in range(scenario["jobs"]):
+        workspace = os.path.join(root, f"job_{i}")
+        make_assembly_workspace(workspace, scenario["slides"], scenario["voiceover_seconds"])
+        workspaces.append(workspace)
+
+    def assemble(workspace):
+        started = time.perf_counter()
+        assemble_video(f"{workspace}/assembly.json", f"{workspace}/videos/benchmark.mp4", workspace=workspace)
+        return time.perf_counter() - started
+
+    start = time.perf_counter()
+    latencies, errors = [], []
+    with ThreadPoolExecutor(max_workers=scenario["concurrency"]) as pool:
+        for future in [pool.submit(assemble, workspace) for workspace in workspaces]:
+            try:
+                latencies.append(future.result())
+            except Exception as e:
+                errors.append(str(e))
+    return time.perf_counter() - start, latencies, errors
+
+
+def run_scenario(scenario):
+    """Run one scenario in this process and return its report."""
+    with tempfile.TemporaryDirectory() as root:
+        os.environ.update({
+            "BUCKET": "benchmark",
+            "SCRIPT_KEY": "benchmark",
+            "WORKSPACE_ROOT": root,
+            "WARM_CLIENTS_ON_STARTUP": "False",
+            "TTS_CACHE_ENABLED": "False",
+            "IMAGE_CACHE_ENABLED": "False",
+            "RESULT_CACHE_ENABLED": "False",
+        })
+        os.environ.update(scenario["env"])
+
+        from app import metrics
+        from app.video_assembly import RENDER_START_METHOD, shutdown_render_pool
+        from benchmarks import fakes
+
+        latency = scenario["latency"]
+        fakes.install(gemini_latency=latency["gemini"], tts_latency=latency["tts"], image_latency=latency["imagen"],
+                      upload_latency=latency["gcs"], sections=scenario["slides"] - 2,
+                      voiceover_seconds=scenario["voiceover_seconds"])
+
+        if scenario["target"] == "pipeline":
+            wall, latencies, errors = asyncio.run(run_pipeline(scenario))
+        else:
+            wall, latencies, errors = run_assembly(scenario, root)
+        # Reap the render workers; with fork or spawn that counts them in the children figures
+        shutdown_render_pool(wait=True)
+        snapshot = metrics.snapshot()
+
+    return {
+        "target": scenario["target"],
+        "slides": scenario["slides"],
+        "concurrency": scenario["concurrency"],
+        "jobs": scenario["jobs"],
+        "completed": len(latencies),
+        "failed": len(errors),
+        "errors": sorted(set(errors)),
+        "wall_seconds": round(wall, 3),
+        "throughput_jobs_per_minute": round(len(latencies) * 60 / wall, 3) if wall else None,
+        "latency_seconds": {
+            "p50": round(percentile(latencies, 0.50), 3) if latencies else None,
+            "p99": round(percentile(latencies, 0.99), 3) if latencies else None,
+            "max": round(max(latencies), 3) if latencies else None,
+        },
+        "render_start_method": RENDER_START_METHOD,
+        **usage_report(snapshot),
+        **stage_report(snapshot),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    latency = {"gemini": args.gemini_latency, "tts": args.tts_latency, "imagen": args.image_latency,
+               "gcs": args.upload_latency}
+    env = dict(item.split("=", 1) for item in args.env)
+    results = []
+    for slides in args.slides:
+        for concurrency in args.concurrency:
+            scenario = {"target": args.target, "slides": slides, "concurrency": concurrency, "jobs": args.jobs,
+                        "voiceover_seconds": args.voiceover_seconds, "latency": latency, "env": env}
+            # A fresh interpreter per scenario keeps peak RSS and CPU separate
+            completed = subprocess.run([sys.executable, "-m", "benchmarks.end_to_end", "--scenario", json.dumps(scenario)],
+                                       capture_output=True, text=True)
+            if completed.returncode != 0:
+                results.append({**scenario, "failed": completed.stderr.strip().splitlines()[-1:]})
+                continue
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "latency": latency,
+        "env": env,
+        "voiceover_seconds": args.voiceover_seconds,
+        "scenarios": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=["pipeline", "assembly"], default="pipeline")
+    parser.add_argument("--slides", type=int, nargs="+", default=[5, 10])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--jobs", type=int, default=4, help="jobs per scenario")
+    parser.add_argument("--voiceover-seconds", type=float, default=8.0)
+    parser.add_argument("--gemini-latency", type=float, default=1.0)
+    parser.add_argument("--tts-latency", type=float, default=0.5)
+    parser.add_argument("--image-latency", type=float, default=2.0)
+    parser.add_argument("--upload-latency", type=float, default=0.5)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        print(json.dumps(run_scenario(json.loads(args.scenario))))
+    else:
+        report = run(args)
+        text = json.dumps(report, indent=4)
+        if args.output:
+            with open(args.output, "w") as file:
+                file.write(text + "\n")
+        print(text)
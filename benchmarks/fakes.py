@@ -0,0 +1,209 @@
+"""Deterministic local stand-ins for Gemini, TTS, Imagen and GCS.
+
+Every fake sleeps for a configurable latency and returns canned content:
+the script JSON from canned_script, silent MP3s of a set length and
+generated PNGs. install() plugs them in through app.clients.set_client and
+app.voiceover_generation.set_tts_backend, so the pipeline runs without
+credentials or network access.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import threading
+import time
+from functools import lru_cache
+from types import SimpleNamespace
+from PIL import Image
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, mono. A frame of zeros after the
+# header decodes as silence.
+SILENT_FRAME = bytes([0xFF, 0xFB, 0x90, 0xC0]) + bytes(413)
+FRAME_SECONDS = 1152 / 44100
+
+
+@lru_cache(maxsize=None)
+def silent_mp3(seconds: float) -> bytes:
+    return SILENT_FRAME * max(1, round(seconds / FRAME_SECONDS))
+
+
+@lru_cache(maxsize=256)
+def placeholder_png(prompt: str, size=(1024, 1024)) -> bytes:
+    """A flat PNG whose colour is derived from the prompt."""
+    digest = hashlib.sha256(prompt.encode()).digest()
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color=tuple(digest[:3])).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def canned_script(topic: str, sections: int = 8) -> dict:
+    def part(name):
+        return {
+            "voiceover": f"This part explains {name} of {topic} in a few plain sentences for the narrator.",
+            "slide_points": [f"{name} key point one", f"{name} key point two", f"{name} key point three"],
+            "image_placeholder": f"An illustration of {name} for {topic}",
+        }
+
+    return {
+        "title": f"All about {topic}",
+        "introduction": part("the introduction"),
+        "sections": [{"heading": f"Section {i + 1}", **part(f"section {i + 1}")} for i in range(sections)],
+        "conclusion": part("the conclusion"),
+    }
+
+
+def topic_from_prompt(prompt: str) -> str:
+    return prompt.split("'")[1] if "'" in prompt else "benchmark"
+
+
+class FakeGeminiModel:
+    """generate_content and streamed generate_content_async returning canned_script."""
+
+    def __init__(self, latency=1.0, sections=8, chunk_size=256):
+        self.latency = latency
+        self.sections = sections
+        self.chunk_size = chunk_size
+
+    def script_text(self, prompt):
+        return "```json\n" + json.dumps(canned_script(topic_from_prompt(prompt), self.sections), indent=4) + "\n```"
+
+    def generate_content(self, prompt):
+        time.sleep(self.latency)
+        return SimpleNamespace(text=self.script_text(prompt))
+
+    async def generate_content_async(self, prompt, stream=False):
+        text = self.script_text(prompt)
+        if not stream:
+            await asyncio.sleep(self.latency)
+            return SimpleNamespace(text=text)
+
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+
+        async def stream_chunks():
+            # The latency is spread over the chunks, like a streamed response
+            for chunk in chunks:
+                await asyncio.sleep(self.latency / len(chunks))
+                yield SimpleNamespace(text=chunk)
+
+        return stream_chunks()
+
+
+class FakeTTSBackend:
+    def __init__(self, latency=0.5, seconds=8.0):
+        self.latency = latency
+        self.seconds = seconds
+
+    def synthesize(self, text, language_code, voice_name, audio_encoding):
+        time.sleep(self.latency)
+        return silent_mp3(self.seconds)
+
+
+class FakeImageClient:
+    """Mimics ``genai.Client().aio.models.generate_images``."""
+
+    def __init__(self, latency=2.0, size=(1024, 1024)):
+        self.latency = latency
+        self.size = size
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_images=self.generate_images))
+
+    async def generate_images(self, model, prompt, config=None):
+        await asyncio.sleep(self.latency)
+        image = SimpleNamespace(image_bytes=placeholder_png(prompt, self.size))
+        return SimpleNamespace(generated_images=[SimpleNamespace(image=image)])
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.updated = None
+
+    def upload_from_filename(self, filename, content_type=None):
+        with open(filename, "rb") as file:
+            self.upload_from_file(file, content_type)
+
+    def upload_from_file(self, file, content_type=None):
+        # Like the real resumable upload, which fails on pipes with ESPIPE
+        file.tell()
+        size = 0
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            size += len(block)
+        time.sleep(self.bucket.client.latency)
+        self.bucket.client.record(self.name, size)
+
+    def open(self, mode="rb", chunk_size=None, content_type=None):
+        assert mode == "wb"
+        return FakeBlobWriter(self)
+
+    def delete(self):
+        self.bucket.client.uploads.pop(self.name, None)
+
+
+class FakeBlobWriter(io.RawIOBase):
+    """What Blob.open("wb") returns: the upload completes on close."""
+
+    def __init__(self, blob):
+        self.blob = blob
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            time.sleep(self.blob.bucket.client.latency)
+            self.blob.bucket.client.record(self.blob.name, self.size)
+        super().close()
+
+
+class FakeBucket:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def blob(self, name, chunk_size=None):
+        return FakeBlob(self, name)
+
+    def get_blob(self, name):
+        return None
+
+
+class FakeStorageClient:
+    """Drains uploads and remembers their sizes; nothing is stored."""
+
+    def __init__(self, latency=0.5):
+        self.latency = latency
+        self.uploads = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, size):
+        with self.lock:
+            self.uploads[name] = size
+
+    def bucket(self, name):
+        return FakeBucket(self, name)
+
+    def close(self):
+        pass
+
+
+def install(gemini_latency=1.0, tts_latency=0.5, image_latency=2.0, upload_latency=0.5, sections=8,
+            voiceover_seconds=8.0):
+    """Replace every upstream with a fake. Returns the fakes by upstream name."""
+    from app import clients
+    from app.voiceover_generation import set_tts_backend
+
+    fakes = {
+        "gemini": FakeGeminiModel(gemini_latency, sections),
+        "tts": FakeTTSBackend(tts_latency, voiceover_seconds),
+        "imagen": FakeImageClient(image_latency),
+        "gcs": FakeStorageClient(upload_latency),
+    }
+    for name in ("gemini", "imagen", "gcs"):
+        clients.set_client(name, fakes[name])
+    set_tts_backend(fakes["tts"])
+    return fakes
@@ -0,0 +1,170 @@
+"""Measure peak memory and time of slide composition with and without download-time image fitting.
+
+Each mode runs in a fresh interpreter and reports the growth of its peak
+RSS (VmHWM) over the RSS it had after importing the app:
+
+- "original" composes every slide from the Imagen-sized image the way
+  create_structured_slide_image did before images were fitted at download
+  time: convert("RGBA") and ImageOps.fit with LANCZOS on every render, and
+  the heading drawn from scratch.
+- "download" is the new download step alone: save_slide_image fits each
+  Imagen-sized image to the slot once and writes a small JPEG.
+- "fitted" composes from those JPEGs with the heading band cache.
+
+The peak RSS of a render worker is that of "original" before and of
+"fitted" after; "download" runs in the job process instead.
+
+    python -m benchmarks.image_memory --slides 20 --image-size 1024 --source-format png
+"""
+import argparse
+import importlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+POINTS = [
+    "Plants convert sunlight into chemical energy",
+    "Chlorophyll absorbs mostly red and blue light",
+    "Oxygen is released as a by-product of the reaction",
+]
+HEADINGS = ["Introduction", "How It Works", "Why It Matters", "The End"]
+
+
+def make_sources(directory, slides, image_size, source_format):
+    """Photo-like stand-ins for Imagen output: noisy, so they compress like real images."""
+    from PIL import Image
+
+    paths = []
+    for i in range(slides):
+        noise = Image.effect_noise((image_size, image_size), 40 + i % 20)
+        gradient = Image.linear_gradient("L").resize((image_size, image_size))
+        image = Image.merge("RGB", [noise, gradient, gradient.rotate(90 * (i % 4))])
+        path = os.path.join(directory, f"source_{i}.{source_format}")
+        image.save(path)
+        paths.append(path)
+    return paths
+
+
+def legacy_fit(image, size):
+    from PIL import Image, ImageOps
+
+    return ImageOps.fit(image.convert("RGBA"), size, Image.LANCZOS)
+
+
+def compose(directory, images, legacy):
+    from app import video_assembly
+
+    for i, image_path in enumerate(images):
+        if legacy:
+            video_assembly.heading_band.cache_clear()
+        video_assembly.create_structured_slide_image(
+            heading=HEADINGS[i % len(HEADINGS)],
+            image_path=image_path,
+            output_path=os.path.join(directory, f"slide_{i}.png"),
+            points=POINTS,
+            slide_index=i + 1,
+        )
+
+
+def memory_kb(field):
+    """VmRSS or VmHWM from /proc. ru_maxrss is no use here: it survives exec, so a
+    child starts out with the peak of the benchmark process that spawned it."""
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def reset_peak():
+    # Drops the import peak from VmHWM (Linux 4.0+)
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        pass
+
+
+def run_mode(mode, directory, slides):
+    """Run one mode in this process and report its time and memory."""
+    from app import video_assembly
+
+    # Loaded before the baseline, like in a warm render worker
+    importlib.import_module("PIL.Image")
+
+    reset_peak()
+    baseline = memory_kb("VmRSS")
+    sources = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.startswith("source_"))
+    fitted = [os.path.join(directory, f"fitted_{i}.jpg") for i in range(len(sources))]
+    images = [fitted[i % len(fitted)] if mode == "fitted" else sources[i % len(sources)] for i in range(slides)]
+
+    start = time.perf_counter()
+    if mode == "download":
+        for source, path in zip(sources, fitted):
+            with open(source, "rb") as file:
+                video_assembly.save_slide_image(file, path, video_assembly.image_slot_size())
+        count = len(sources)
+    elif mode == "original":
+        with mock.patch.object(video_assembly, "fit_image", legacy_fit):
+            compose(directory, images, legacy=True)
+        count = slides
+    else:
+        compose(directory, images, legacy=False)
+        count = slides
+    elapsed = time.perf_counter() - start
+
+    peak = memory_kb("VmHWM")
+    return {
+        "mode": mode,
+        "ms_per_image": round(elapsed * 1000 / count, 2),
+        "peak_rss_mb": round(peak / 1024, 1),
+        "rss_growth_mb": round((peak - baseline) / 1024, 1),
+    }
+
+
+def run(slides, image_size, source_format):
+    with tempfile.TemporaryDirectory() as directory:
+        sources = make_sources(directory, min(slides, 8), image_size, source_format)
+        reports = {}
+        # "download" writes the JPEGs that "fitted" composes from
+        for mode in ("original", "download", "fitted"):
+            completed = subprocess.run([sys.executable, "-m", "benchmarks.image_memory", "--mode", mode,
+                                        "--directory", directory, "--slides", str(slides)],
+                                       check=True, capture_output=True, text=True)
+            reports[mode] = json.loads(completed.stdout.strip().splitlines()[-1])
+        source_bytes = sum(os.path.getsize(path) for path in sources)
+        fitted_bytes = sum(os.path.getsize(os.path.join(directory, f"fitted_{i}.jpg")) for i in range(len(sources)))
+
+    return {
+        "slides": slides,
+        "image_size": image_size,
+        "source_format": source_format,
+        "modes": reports,
+        "render_worker_rss_saved_mb": round(reports["original"]["rss_growth_mb"] - reports["fitted"]["rss_growth_mb"], 1),
+        "compose_speedup": round(reports["original"]["ms_per_image"] / reports["fitted"]["ms_per_image"], 2),
+        "mean_source_kb": round(source_bytes / len(sources) / 1024, 1),
+        "mean_fitted_kb": round(fitted_bytes / len(sources) / 1024, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--slides", type=int, default=20)
+    parser.add_argument("--image-size", type=int, default=1024, help="edge of the square Imagen-sized sources")
+    parser.add_argument("--source-format", choices=["png", "jpeg"], default="png")
+    parser.add_argument("--mode", choices=["original", "download", "fitted"], help=argparse.SUPPRESS)
+    parser.add_argument("--directory", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.directory, args.slides)))
+    else:
+        print(json.dumps(run(args.slides, args.image_size, args.source_format), indent=4))
@@ -0,0 +1,84 @@
+"""Check that importing the app stays fast and free of SDK side effects.
+
+Imports app.main in fresh interpreters with ``-X importtime`` and without
+any credentials or keys in the environment. Fails (exit code 1) when the
+median import time is over the budget or when one of the heavy SDKs that
+are meant to load lazily shows up in sys.modules.
+
+    python -m benchmarks.import_time --budget-ms 1000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Loaded on first use or during the lifespan warm-up, never on import
+LAZY_MODULES = [
+    "google.generativeai",
+    "google.genai",
+    "google.cloud.texttospeech",
+    "google.cloud.storage",
+    "PIL",
+    "pydub",
+]
+
+# Importing the app must not need any of these
+UNSET = ["SCRIPT_KEY", "IMAGE_KEY", "BUCKET", "GOOGLE_APPLICATION_CREDENTIALS"]
+
+PROBE = (
+    "import json, sys; import app.main; "
+    f"print(json.dumps(sorted(m for m in sys.modules if m.split('.')[0] in {{'google', 'PIL', 'pydub'}} "
+    f"and any(m == lazy or m.startswith(lazy + '.') for lazy in {LAZY_MODULES!r}))))"
+)
+
+
+def parse_importtime(stderr):
+    """Map module name to cumulative import time in microseconds."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def measure():
+    env = {key: value for key, value in os.environ.items() if key not in UNSET}
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE], env=env, capture_output=True,
+                               text=True)
+    if completed.returncode != 0:
+        raise SystemExit(f"Importing app.main failed:\n{completed.stderr[-2000:]}")
+    return parse_importtime(completed.stderr), json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run(runs, budget_ms, top):
+    samples = [measure() for _ in range(runs)]
+    totals = [times["app.main"] / 1000 for times, _ in samples]
+    times, loaded = samples[-1]
+    slowest = sorted(((name, round(value / 1000, 1)) for name, value in times.items() if name != "app.main"),
+                     key=lambda item: item[1], reverse=True)[:top]
+    median = statistics.median(totals)
+    return {
+        "runs": runs,
+        "budget_ms": budget_ms,
+        "median_ms": round(median, 1),
+        "min_ms": round(min(totals), 1),
+        "max_ms": round(max(totals), 1),
+        "slowest_modules_ms": dict(slowest),
+        "lazy_modules_loaded": loaded,
+        "ok": median <= budget_ms and not loaded,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1000.0)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    report = run(args.runs, args.budget_ms, args.top)
+    print(json.dumps(report, indent=4))
+    sys.exit(0 if report["ok"] else 1)
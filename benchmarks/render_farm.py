@@ -0,0 +1,108 @@
+"""Run a local render farm: several render workers sharing one SQLite job store.
+
+Starts --workers render worker processes with the fake upstreams from
+benchmarks.fakes, submits --jobs jobs through a thin JobManager (like an
+API process with JOB_STORE set) and reports throughput and latency.
+Needs ffmpeg on PATH for the encodes.
+
+    python -m benchmarks.render_farm --workers 1 2 4 --jobs 8 --slides 6
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.end_to_end import percentile
+
+LATENCY = {"gemini": 0.5, "tts": 0.2, "imagen": 0.5, "gcs": 0.2}
+
+
+def farm_env(root, store_path, slides):
+    return {
+        **os.environ,
+        "BUCKET": "benchmark",
+        "SCRIPT_KEY": "benchmark",
+        "WORKSPACE_ROOT": root,
+        "JOB_STORE": f"sqlite:///{store_path}",
+        "WARM_CLIENTS_ON_STARTUP": "False",
+        "TTS_CACHE_ENABLED": "False",
+        "IMAGE_CACHE_ENABLED": "False",
+        "RESULT_CACHE_ENABLED": "False",
+        "JOB_POLL_INTERVAL": "0.1",
+        "HEARTBEAT_INTERVAL": "1",
+        "BENCHMARK_SLIDES": str(slides),
+    }
+
+
+def run_worker():
+    from app import render_worker
+    from benchmarks import fakes
+
+    fakes.install(gemini_latency=LATENCY["gemini"], tts_latency=LATENCY["tts"], image_latency=LATENCY["imagen"],
+                  upload_latency=LATENCY["gcs"], sections=int(os.environ["BENCHMARK_SLIDES"]) - 2)
+    asyncio.run(render_worker.main())
+
+
+async def submit_and_wait(jobs, store_url):
+    from app.jobs import JobManager
+    from app.job_store import get_job_store
+
+    store = get_job_store(store_url)
+    manager = JobManager(None, max_workers=0, store=store)
+    start = time.perf_counter()
+    job_ids = [(await manager.submit(f"farm topic {i}")).job_id for i in range(jobs)]
+    while True:
+        states = [manager.get(job_id) for job_id in job_ids]
+        if all(job.finished_at is not None for job in states):
+            break
+        await asyncio.sleep(0.1)
+    return time.perf_counter() - start, states, store.stats()
+
+
+def run(workers, jobs, slides):
+    with tempfile.TemporaryDirectory() as root:
+        env = farm_env(root, os.path.join(root, "jobs.db"), slides)
+        processes = [subprocess.Popen([sys.executable, "-m", "benchmarks.render_farm", "--worker"], env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                     for _ in range(workers)]
+        try:
+            wall, states, stats = asyncio.run(submit_and_wait(jobs, env["JOB_STORE"]))
+        finally:
+            for process in processes:
+                process.send_signal(signal.SIGTERM)
+            for process in processes:
+                process.wait(timeout=30)
+
+    latencies = [job.finished_at - job.created_at for job in states if job.status == "completed"]
+    return {
+        "workers": workers,
+        "jobs": jobs,
+        "slides": slides,
+        "completed": len(latencies),
+        "errors": sorted({job.error for job in states if job.status != "completed"}),
+        "wall_seconds": round(wall, 3),
+        "throughput_jobs_per_minute": round(len(latencies) * 60 / wall, 3),
+        "latency_seconds": {
+            "p50": round(percentile(latencies, 0.50), 3) if latencies else None,
+            "p99": round(percentile(latencies, 0.99), 3) if latencies else None,
+        },
+        "store": stats,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--jobs", type=int, default=6)
+    parser.add_argument("--slides", type=int, default=6)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker()
+    else:
+        print(json.dumps([run(workers, args.jobs, args.slides) for workers in args.workers], indent=4))
@@ -0,0 +1,82 @@
+"""Measure time per slide image with and without the font/text caches.
+
+The "uncached" run clears the font registry, width memo and heading bands
+before every slide and measures words by rasterizing them, as slide rendering did before
+the registry existed.
+
+    python -m benchmarks.slide_rendering --slides 50
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+from PIL import Image, ImageDraw
+from app import video_assembly
+from app.video_assembly import create_structured_slide_image, get_font, heading_band, text_width
+
+POINTS = [
+    "Plants convert sunlight into chemical energy",
+    "Chlorophyll absorbs mostly red and blue light",
+    "Oxygen is released as a by-product of the reaction",
+    "Glucose fuels growth and cellular respiration",
+]
+
+
+def raster_wrap_text(text, font, max_width):
+    words = text.split() if isinstance(text, str) else text
+    lines = []
+    current_line = ""
+    for word in words:
+        test_line = current_line + " " + word if current_line else word
+        temp_img = Image.new("RGB", (1000, 100), color="white")
+        ImageDraw.Draw(temp_img).text((0, 0), test_line, font=font, fill="black")
+        bbox = temp_img.getbbox()
+        if (bbox[2] if bbox else 0) <= max_width:
+            current_line = test_line
+        else:
+            lines.append(current_line)
+            current_line = word
+    lines.append(current_line)
+    return lines
+
+
+def render(slides, workdir, cached):
+    start = time.perf_counter()
+    for i in range(slides):
+        if not cached:
+            get_font.cache_clear()
+            text_width.cache_clear()
+            heading_band.cache_clear()
+        create_structured_slide_image(
+            heading=f"Benchmark Slide {i + 1}",
+            image_path=None,
+            output_path=os.path.join(workdir, f"slide_{i}.png"),
+            points=POINTS,
+            slide_index=i + 1,
+        )
+    return (time.perf_counter() - start) * 1000 / slides
+
+
+def run(slides):
+    with tempfile.TemporaryDirectory() as workdir:
+        with mock.patch.object(video_assembly, "wrap_text", raster_wrap_text):
+            uncached = render(slides, workdir, cached=False)
+        get_font.cache_clear()
+        text_width.cache_clear()
+        heading_band.cache_clear()
+        cached = render(slides, workdir, cached=True)
+    return {
+        "slides": slides,
+        "uncached_ms_per_slide": round(uncached, 3),
+        "cached_ms_per_slide": round(cached, 3),
+        "speedup": round(uncached / cached, 2) if cached else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--slides", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(run(args.slides), indent=4))
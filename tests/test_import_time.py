@@ -0,0 +1,19 @@
+"""Importing the app stays fast and free of SDK side effects; see benchmarks.import_time.
+
+Each run imports app.main in a fresh interpreter without any keys or
+credentials in the environment.
+"""
+from benchmarks.import_time import run
+
+# Median import time of app.main, the default of the benchmark
+BUDGET_MS = 1000.0
+
+
+def test_import_time_within_budget():
+    report = run(runs=3, budget_ms=BUDGET_MS, top=5)
+    assert report["median_ms"] <= BUDGET_MS, report
+
+
+def test_import_loads_no_lazy_sdks():
+    report = run(runs=1, budget_ms=BUDGET_MS, top=0)
+    assert report["lazy_modules_loaded"] == [], report